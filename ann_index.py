@@ -0,0 +1,92 @@
+# ann_index.py
+import math
+
+import faiss
+import numpy as np
+
+INDEX_TYPES = ('flat', 'ivf_flat', 'ivf_pq', 'hnsw')
+
+
+def default_nlist(num_vectors):
+    """Rule of thumb from the FAISS guidelines: about 4 * sqrt(N) inverted lists."""
+    return max(1, int(4 * math.sqrt(num_vectors)))
+
+
+def min_training_vectors(index_type, nlist=None, pq_nbits=8):
+    """Smallest number of vectors that gives a usable training set for index_type."""
+    if index_type == 'ivf_flat':
+        return 39 * (nlist or 1)
+    if index_type == 'ivf_pq':
+        return max(39 * (nlist or 1), 39 * (2 ** pq_nbits))
+    return 0
+
+
+def default_pq_m(dimension):
+    """Number of PQ sub-quantizers: about one per 8 dimensions, and always a divisor of the dimension."""
+    for m in range(max(1, dimension // 8), 0, -1):
+        if dimension % m == 0:
+            return m
+    return 1
+
+
+def build_index(index_type, dimension, training_vectors=None, nlist=None, pq_m=None, pq_nbits=8, hnsw_m=32):
+    """
+    Creates an empty index of the given type, training it on training_vectors if it needs training.
+    IVF indexes get a direct map so that document-scoped searches can reconstruct vectors by id.
+    """
+    if index_type == 'flat':
+        return faiss.IndexFlatL2(dimension)
+    if index_type == 'hnsw':
+        return faiss.IndexHNSWFlat(dimension, hnsw_m)
+    if index_type not in ('ivf_flat', 'ivf_pq'):
+        raise ValueError(f"Unknown FAISS index type: {index_type}. Expected one of {INDEX_TYPES}.")
+
+    if training_vectors is None or len(training_vectors) == 0:
+        raise ValueError(f"Index type {index_type} needs training vectors.")
+    nlist = nlist or default_nlist(len(training_vectors))
+    quantizer = faiss.IndexFlatL2(dimension)
+    if index_type == 'ivf_flat':
+        index = faiss.IndexIVFFlat(quantizer, dimension, nlist)
+    else:
+        pq_m = pq_m or default_pq_m(dimension)
+        if dimension % pq_m != 0:
+            raise ValueError(f"PQ sub-quantizer count {pq_m} must divide the dimension {dimension}.")
+        index = faiss.IndexIVFPQ(quantizer, dimension, nlist, pq_m, pq_nbits)
+    index.train(np.ascontiguousarray(training_vectors, dtype='float32'))
+    index.make_direct_map()
+    return index
+
+
+def index_type_of(index):
+    """Returns the INDEX_TYPES name of an existing FAISS index."""
+    if isinstance(index, faiss.IndexHNSW):
+        return 'hnsw'
+    if isinstance(index, faiss.IndexIVFPQ):
+        return 'ivf_pq'
+    if isinstance(index, faiss.IndexIVF):
+        return 'ivf_flat'
+    return 'flat'
+
+
+def set_search_params(index, nprobe=None, ef_search=None):
+    """Applies the recall/latency knobs that are relevant for the index type."""
+    if nprobe is not None and isinstance(index, faiss.IndexIVF):
+        index.nprobe = nprobe
+    if ef_search is not None and isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = ef_search
+
+
+def promote_index(vectors, index_type, dimension, training_sample_size=100000, seed=1234, **build_kwargs):
+    """
+    Builds an index of index_type holding vectors, training it on a random sample of them.
+    Returns the new index; the vectors keep their positions as FAISS ids.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype='float32')
+    training_vectors = vectors
+    if len(vectors) > training_sample_size:
+        rng = np.random.default_rng(seed)
+        sample = rng.choice(len(vectors), size=training_sample_size, replace=False)
+        training_vectors = vectors[np.sort(sample)]
+    index = build_index(index_type, dimension, training_vectors, **build_kwargs)
+    index.add(vectors)
+    return index
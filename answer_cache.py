@@ -0,0 +1,118 @@
+# answer_cache.py
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_query(text):
+    """Case, spacing and trailing punctuation do not change a question."""
+    text = _WHITESPACE_RE.sub(' ', unicodedata.normalize('NFC', text)).strip().lower()
+    return text.rstrip('?!. ')
+
+
+class _Entry:
+    def __init__(self, embedding, answer):
+        self.embedding = embedding
+        self.answer = answer
+        self.created_at = time.time()
+
+
+class AnswerCache:
+    """
+    In-memory cache of answers per document.
+
+    A question hits if its normalized text was answered before, or, given its embedding,
+    if a cached question's embedding has cosine similarity of at least similarity_threshold.
+    Each document keeps at most max_entries_per_doc answers, evicting the least recently
+    used; entries expire after ttl_seconds. invalidate() drops a document's answers when
+    its indexed content changes.
+    """
+
+    def __init__(self, max_entries_per_doc=256, ttl_seconds=24 * 3600, similarity_threshold=0.95):
+        self.max_entries_per_doc = max_entries_per_doc
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self._lock = threading.Lock()
+        # doc_id -> OrderedDict(normalized query -> _Entry), least recently used first
+        self._docs = {}
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _unit(embedding):
+        embedding = np.asarray(embedding, dtype='float32').reshape(-1)
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm else embedding
+
+    def _expired(self, entry):
+        return self.ttl_seconds and time.time() - entry.created_at > self.ttl_seconds
+
+    def get(self, doc_id, query, embedding=None):
+        """Returns the cached answer for query on doc_id, or None. Without embedding only exact hits are found."""
+        key = normalize_query(query)
+        with self._lock:
+            entries = self._docs.get(doc_id)
+            if not entries:
+                if embedding is not None:
+                    self.misses += 1
+                return None
+            entry = entries.get(key)
+            if entry is not None and self._expired(entry):
+                del entries[key]
+                entry = None
+            if entry is not None:
+                entries.move_to_end(key)
+                self.hits += 1
+                return entry.answer
+            if embedding is None:
+                return None
+
+            # Expired entries are dropped before comparing embeddings.
+            for stale_key in [k for k, e in entries.items() if self._expired(e)]:
+                del entries[stale_key]
+            if not entries:
+                self.misses += 1
+                return None
+            keys = list(entries)
+            similarities = np.stack([entries[k].embedding for k in keys]) @ self._unit(embedding)
+            best = int(similarities.argmax())
+            if similarities[best] < self.similarity_threshold:
+                self.misses += 1
+                return None
+            entries.move_to_end(keys[best])
+            self.hits += 1
+            self.semantic_hits += 1
+            return entries[keys[best]].answer
+
+    def put(self, doc_id, query, embedding, answer):
+        key = normalize_query(query)
+        with self._lock:
+            entries = self._docs.setdefault(doc_id, OrderedDict())
+            entries[key] = _Entry(self._unit(embedding), answer)
+            entries.move_to_end(key)
+            while len(entries) > self.max_entries_per_doc:
+                entries.popitem(last=False)
+
+    def invalidate(self, doc_id):
+        """Drops all cached answers of doc_id."""
+        with self._lock:
+            self._docs.pop(doc_id, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'documents': len(self._docs),
+                'entries': sum(len(entries) for entries in self._docs.values()),
+                'hits': self.hits,
+                'semantic_hits': self.semantic_hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
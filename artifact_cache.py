@@ -0,0 +1,92 @@
+# artifact_cache.py
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+
+class ArtifactCache:
+    """
+    On-disk cache of generated study artifacts (flashcards, Q&A pairs, mind maps) per document.
+
+    An artifact is stored under its document as <artifact>-<key>.json, where the key hashes
+    the text it was generated from (the summary), the model and the generation parameters,
+    so a changed summary, model or parameter set never serves a stale artifact. Only the
+    latest version of each artifact is kept.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(source_text, model_name, params):
+        source_hash = hashlib.sha256(source_text.encode('utf-8')).hexdigest()
+        data = json.dumps([source_hash, model_name, params], sort_keys=True)
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()[:32]
+
+    def _document_dir(self, document_id):
+        return os.path.join(self.directory, document_id)
+
+    def _path(self, document_id, artifact, key):
+        return os.path.join(self._document_dir(document_id), f"{artifact}-{key}.json")
+
+    def get(self, document_id, artifact, source_text, model_name, params):
+        """Returns the cached artifact value, or None."""
+        path = self._path(document_id, artifact, self.key(source_text, model_name, params))
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)['value']
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring unreadable cached {artifact} of document {document_id}: {e}")
+            return None
+
+    def put(self, document_id, artifact, source_text, model_name, params, value):
+        key = self.key(source_text, model_name, params)
+        path = self._path(document_id, artifact, key)
+        record = {
+            'artifact': artifact,
+            'model': model_name,
+            'params': params,
+            'created_at': time.time(),
+            'value': value,
+        }
+        # A unique temporary file per writer: concurrent puts of the same key must not share one.
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f"{os.path.basename(path)}.",
+                                            suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(record, f)
+                os.replace(tmp_path, path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        except OSError as e:
+            # E.g. the document was invalidated meanwhile; the artifact is simply not cached.
+            print(f"Could not cache {artifact} of document {document_id}: {e}")
+            return
+        # Older versions of the artifact can never be served again.
+        self.invalidate(document_id, artifact, keep=os.path.basename(path))
+
+    def invalidate(self, document_id, artifact=None, keep=None):
+        """Removes the cached artifacts of a document (all of them, or only the given artifact)."""
+        document_dir = self._document_dir(document_id)
+        if artifact is None:
+            shutil.rmtree(document_dir, ignore_errors=True)
+            return
+        if not os.path.isdir(document_dir):
+            return
+        for name in os.listdir(document_dir):
+            # Only finished entries; temporary files belong to writers still in progress.
+            if name.startswith(f"{artifact}-") and name.endswith('.json') and name != keep:
+                try:
+                    os.remove(os.path.join(document_dir, name))
+                except FileNotFoundError:
+                    pass
@@ -0,0 +1,96 @@
+# benchmark_chunking.py
+"""
+Throughput of sentence_based_chunking on a large synthetic (or given) document,
+compared with the previous quadratic chunker on the same sentences:
+    python benchmark_chunking.py --pages 1000 --max-words 200
+    python benchmark_chunking.py --input extracted_text.txt
+"""
+import argparse
+import random
+import time
+
+from create_chunks import get_nlp, iter_sentence_chunks, iter_sentences
+
+WORDS = (
+    "the model index document chunk query page summary result vector system data process "
+    "search answer question text learning network memory storage latency throughput"
+).split()
+
+
+def synthetic_pages(num_pages, words_per_page, seed):
+    """Pages of random sentences of 5-40 words, separated into paragraphs."""
+    rng = random.Random(seed)
+    pages = []
+    for _ in range(num_pages):
+        paragraphs = []
+        words = 0
+        while words < words_per_page:
+            sentences = []
+            for _ in range(rng.randint(2, 6)):
+                length = rng.randint(5, 40)
+                sentence = " ".join(rng.choice(WORDS) for _ in range(length))
+                sentences.append(sentence.capitalize() + ".")
+                words += length
+            paragraphs.append(" ".join(sentences))
+        pages.append("\n\n".join(paragraphs))
+    return pages
+
+
+def quadratic_chunks(sentences, max_words):
+    """The previous chunker: re-joins and re-splits the whole chunk for every sentence."""
+    chunks = []
+    current_chunk = []
+    for sentence in sentences:
+        if len(" ".join(current_chunk + [sentence]).split()) <= max_words:
+            current_chunk.append(sentence)
+        else:
+            if current_chunk:
+                chunks.append(" ".join(current_chunk))
+            current_chunk = [sentence]
+    if current_chunk:
+        chunks.append(" ".join(current_chunk))
+    return chunks
+
+
+def report(name, elapsed, num_pages, num_words, num_chunks):
+    print(f"{name:<32} {elapsed:>8.2f}s {num_pages / elapsed:>10.1f} pages/s "
+          f"{num_words / elapsed / 1000:>10.1f}k words/s {num_chunks:>8} chunks")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, default=1000)
+    parser.add_argument('--words-per-page', type=int, default=500)
+    parser.add_argument('--input', help="Text file to chunk instead of synthetic pages (pages split on form feeds).")
+    parser.add_argument('--max-words', type=int, default=200)
+    parser.add_argument('--overlap', type=int, default=0)
+    parser.add_argument('--seed', type=int, default=1234)
+    args = parser.parse_args()
+
+    if args.input:
+        with open(args.input, 'r', encoding='utf-8') as f:
+            pages = [page for page in f.read().split('\f') if page.strip()]
+    else:
+        pages = synthetic_pages(args.pages, args.words_per_page, args.seed)
+    num_words = sum(len(page.split()) for page in pages)
+    print(f"{len(pages)} pages, {num_words} words, spaCy pipeline: {get_nlp().pipe_names}\n")
+
+    started = time.perf_counter()
+    sentences = list(iter_sentences(pages))
+    report("sentence segmentation", time.perf_counter() - started, len(pages), num_words, 0)
+
+    started = time.perf_counter()
+    chunks = quadratic_chunks(sentences, args.max_words)
+    report("quadratic chunking (no spaCy)", time.perf_counter() - started, len(pages), num_words, len(chunks))
+
+    started = time.perf_counter()
+    chunks = list(iter_sentence_chunks(pages, max_words=args.max_words, overlap=args.overlap))
+    report("segmentation + chunking", time.perf_counter() - started, len(pages), num_words, len(chunks))
+
+    started = time.perf_counter()
+    chunks = list(iter_sentence_chunks(iter(pages), max_words=args.max_words, overlap=args.overlap, batch_size=1))
+    report("streaming (batch_size=1)", time.perf_counter() - started, len(pages), num_words, len(chunks))
+
+
+if __name__ == '__main__':
+    main()
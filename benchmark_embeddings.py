@@ -0,0 +1,101 @@
+# benchmark_embeddings.py
+"""
+Throughput and retrieval quality of the embedding backends against the default torch encoder.
+
+Embeds chunks of the global chunk store when it holds enough of them, otherwise synthetic chunks:
+    python benchmark_embeddings.py --num-chunks 2000 --backends torch quantized onnx --threads 4
+"""
+import argparse
+import os
+import random
+import time
+
+import faiss
+import numpy as np
+
+from benchmark_chunking import synthetic_pages
+from model_registry import EMBEDDING_BACKENDS, load_embedder
+
+
+def load_chunks(num_chunks, seed):
+    """Returns up to num_chunks chunk texts from the global chunk store, padded with synthetic chunks."""
+    chunks = []
+    try:
+        from chunk_store import ChunkStore
+        from mistral_response import FAISS_INDEX_DIR
+        if os.path.exists(os.path.join(FAISS_INDEX_DIR, 'chunks.rows')):
+            # Read-only: the benchmark must never truncate a live store it happens to race.
+            store = ChunkStore(FAISS_INDEX_DIR, read_only=True)
+            chunks = [store.text(row) for row in range(min(len(store), num_chunks))]
+            store.close()
+    except Exception as e:
+        print(f"Could not read the chunk store ({e}); using synthetic chunks only.")
+
+    missing = num_chunks - len(chunks)
+    if missing > 0:
+        words = " ".join(synthetic_pages(missing // 2 + 1, 500, seed)).split()
+        chunks += [" ".join(words[start:start + 200]) for start in range(0, missing * 200, 200)]
+    return chunks[:num_chunks]
+
+
+def timed_encode(model, texts, batch_size):
+    started = time.perf_counter()
+    vectors = model.encode(texts, batch_size=batch_size, convert_to_numpy=True).astype('float32')
+    return vectors, time.perf_counter() - started
+
+
+def recall_at_k(found, truth):
+    k = truth.shape[1]
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / (len(truth) * k)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--num-chunks', type=int, default=2000)
+    parser.add_argument('--num-queries', type=int, default=200)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--threads', type=int, default=0, help="Intra-op threads (0: library default).")
+    parser.add_argument('--backends', nargs='+', default=list(EMBEDDING_BACKENDS), choices=EMBEDDING_BACKENDS)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=1234)
+    args = parser.parse_args()
+
+    chunks = load_chunks(args.num_chunks, args.seed)
+    rng = random.Random(args.seed)
+    # Queries: the opening words of randomly chosen chunks.
+    queries = [" ".join(chunk.split()[:12]) for chunk in rng.sample(chunks, min(args.num_queries, len(chunks)))]
+    print(f"{len(chunks)} chunks, {len(queries)} queries, batch size {args.batch_size}, threads {args.threads or 'default'}\n")
+
+    backends = ['torch'] + [backend for backend in args.backends if backend != 'torch']
+    baseline = None
+    print(f"{'backend':<12} {'load s':>8} {'chunks/s':>10} {'mean cos':>10} {f'recall@{args.k}':>10}")
+    for backend in backends:
+        try:
+            started = time.perf_counter()
+            model = load_embedder(backend, threads=args.threads)
+            load_seconds = time.perf_counter() - started
+        except Exception as e:
+            print(f"{backend:<12} could not be loaded: {e}")
+            continue
+        model.encode(chunks[:args.batch_size], batch_size=args.batch_size)  # warm-up
+        vectors, elapsed = timed_encode(model, chunks, args.batch_size)
+        query_vectors, _ = timed_encode(model, queries, args.batch_size)
+
+        index = faiss.IndexFlatL2(vectors.shape[1])
+        index.add(vectors)
+        _, found = index.search(query_vectors, args.k)
+        if baseline is None:
+            baseline = (vectors, found)
+            mean_cos, recall = 1.0, 1.0
+        else:
+            base_vectors, base_found = baseline
+            normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+            base_normalized = base_vectors / np.linalg.norm(base_vectors, axis=1, keepdims=True)
+            mean_cos = float((normalized * base_normalized).sum(axis=1).mean())
+            recall = recall_at_k(found, base_found)
+        print(f"{backend:<12} {load_seconds:>8.2f} {len(chunks) / elapsed:>10.1f} {mean_cos:>10.4f} {recall:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
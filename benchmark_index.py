@@ -0,0 +1,131 @@
+# benchmark_index.py
+"""
+Recall-vs-latency report for the approximate FAISS index types against the exact flat baseline,
+for searches over the whole index and for document-scoped searches (as /query_document runs them).
+
+Uses the vectors of the global index's latest snapshot when it holds enough of them, otherwise
+random vectors. The snapshot is opened read-only, so this can run next to a live server:
+    python benchmark_index.py --num-vectors 200000 --num-queries 1000 --k 5 --doc-size 500
+"""
+import argparse
+import time
+
+import faiss
+import numpy as np
+
+from ann_index import build_index, default_nlist, promote_index, set_search_params
+from index_manager import SCOPED_EXACT_MAX_VECTORS, read_snapshot, search_ranges
+
+NPROBE_SWEEP = (1, 4, 8, 16, 32, 64)
+EF_SEARCH_SWEEP = (16, 32, 64, 128, 256)
+
+
+def load_vectors(num_vectors, dimension, seed, index_dir):
+    """Returns up to num_vectors vectors from the global index snapshot, padded with random vectors."""
+    vectors = np.empty((0, dimension), dtype='float32')
+    try:
+        index = read_snapshot(index_dir)
+        if index is not None:
+            count = min(index.ntotal, num_vectors)
+            if count:
+                vectors = index.reconstruct_n(0, count)
+                dimension = index.d
+    except Exception as e:
+        print(f"Could not read the global index snapshot ({e}); using random vectors only.")
+
+    missing = num_vectors - len(vectors)
+    if missing > 0:
+        rng = np.random.default_rng(seed)
+        vectors = np.vstack([vectors, rng.standard_normal((missing, dimension)).astype('float32')])
+    return np.ascontiguousarray(vectors, dtype='float32')
+
+
+def timed_search(index, queries, k):
+    started = time.perf_counter()
+    _, I = index.search(queries, k)
+    elapsed = time.perf_counter() - started
+    return I, elapsed * 1000 / len(queries)
+
+
+def timed_scoped_search(index, queries, query_docs, k, doc_size, **params):
+    """Searches each query within its document's id range, one query at a time like a request."""
+    found = np.empty((len(queries), k), dtype='int64')
+    started = time.perf_counter()
+    for row, (query, doc) in enumerate(zip(queries, query_docs)):
+        ranges = [[doc * doc_size, min((doc + 1) * doc_size, index.ntotal)]]
+        _, I = search_ranges(index, query[None, :], k, ranges, **params)
+        found[row] = I[0]
+    elapsed = time.perf_counter() - started
+    return found, elapsed * 1000 / len(queries)
+
+
+def recall_at_k(found, truth):
+    k = truth.shape[1]
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / (len(truth) * k)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--num-vectors', type=int, default=100000)
+    parser.add_argument('--num-queries', type=int, default=1000)
+    parser.add_argument('--dimension', type=int, default=384)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--doc-size', type=int, default=500,
+                        help='vectors per simulated document for the document-scoped searches')
+    parser.add_argument('--scoped-exact-max', type=int, default=SCOPED_EXACT_MAX_VECTORS,
+                        help='largest document scanned exactly; 0 always searches through the index')
+    parser.add_argument('--index-dir', default='faiss_indexes')
+    args = parser.parse_args()
+
+    vectors = load_vectors(args.num_vectors, args.dimension, args.seed, args.index_dir)
+    dimension = vectors.shape[1]
+    rng = np.random.default_rng(args.seed + 1)
+    # Queries are perturbed stored vectors, which resembles real questions about indexed text.
+    query_ids = rng.choice(len(vectors), size=args.num_queries)
+    queries = vectors[query_ids]
+    queries = queries + 0.05 * rng.standard_normal(queries.shape).astype('float32')
+    # Each query is scoped to the simulated document (consecutive ids) holding the vector it came from.
+    query_docs = query_ids // args.doc_size
+
+    flat = build_index('flat', dimension)
+    flat.add(vectors)
+    truth, flat_ms = timed_search(flat, queries, args.k)
+    scoped_truth, scoped_flat_ms = timed_scoped_search(flat, queries, query_docs, args.k, args.doc_size)
+
+    print(f"{len(vectors)} vectors, dimension {dimension}, {args.num_queries} queries, k={args.k}, "
+          f"{faiss.omp_get_max_threads()} threads")
+    print(f"Document-scoped searches: documents of {args.doc_size} vectors.")
+    print(f"{'index':<10} {'param':<14} {'build s':>8} {'recall@k':>9} {'ms/query':>9} {'speedup':>8} "
+          f"{'doc recall':>11} {'doc ms':>8}")
+    print(f"{'flat':<10} {'-':<14} {0.0:>8.1f} {1.0:>9.3f} {flat_ms:>9.3f} {1.0:>8.1f} "
+          f"{1.0:>11.3f} {scoped_flat_ms:>8.3f}")
+
+    for index_type in ('ivf_flat', 'ivf_pq', 'hnsw'):
+        started = time.perf_counter()
+        try:
+            index = promote_index(vectors, index_type, dimension)
+        except ValueError as e:
+            print(f"{index_type:<10} skipped: {e}")
+            continue
+        build_seconds = time.perf_counter() - started
+
+        if index_type == 'hnsw':
+            sweep = [('efSearch', value, {'ef_search': value}) for value in EF_SEARCH_SWEEP]
+        else:
+            nlist = default_nlist(len(vectors))
+            sweep = [('nprobe', value, {'nprobe': value}) for value in NPROBE_SWEEP if value <= nlist]
+
+        for name, value, params in sweep:
+            set_search_params(index, **params)
+            found, ms = timed_search(index, queries, args.k)
+            scoped_found, scoped_ms = timed_scoped_search(index, queries, query_docs, args.k, args.doc_size,
+                                                          exact_max=args.scoped_exact_max, **params)
+            print(f"{index_type:<10} {f'{name}={value}':<14} {build_seconds:>8.1f} "
+                  f"{recall_at_k(found, truth):>9.3f} {ms:>9.3f} {flat_ms / ms:>8.1f} "
+                  f"{recall_at_k(scoped_found, scoped_truth):>11.3f} {scoped_ms:>8.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+# bm25_index.py
+import math
+import re
+import threading
+from collections import Counter
+
+# Keeps terms like "3.2", "tf-idf" and "h2o" whole.
+_TOKEN_RE = re.compile(r'[a-z0-9]+(?:[._\-][a-z0-9]+)*')
+_STOPWORDS = frozenset("""
+a an and are as at be but by for from has have in into is it its of on or that the their them then there
+these they this to was were what when where which who why will with how does do did can about
+""".split())
+
+
+def tokenize(text):
+    """Lowercased word, number and identifier tokens of text, without stopwords."""
+    return [token for token in _TOKEN_RE.findall(text.lower()) if token not in _STOPWORDS]
+
+
+class _DocumentPostings:
+    """Inverted index of one document's chunks."""
+
+    def __init__(self):
+        # term -> list of (chunk id, term frequency)
+        self.postings = {}
+        # chunk id -> number of tokens
+        self.lengths = {}
+        self.total_length = 0
+
+    def add(self, chunk_id, text):
+        tokens = tokenize(text)
+        self.lengths[chunk_id] = len(tokens)
+        self.total_length += len(tokens)
+        for term, tf in Counter(tokens).items():
+            self.postings.setdefault(term, []).append((chunk_id, tf))
+
+
+class BM25Index:
+    """
+    In-memory BM25 index over the chunks in the FAISS index, identified by their FAISS ids.
+
+    Postings are kept per document, so a document-scoped search only touches the posting
+    lists of that document's chunks, and term statistics are those of the document.
+    Documents are added chunk batch by chunk batch at ingestion; a document that is not
+    in memory (e.g. after a restart) is built on its first search from load_chunks(doc_id),
+    which returns the document's (chunk id, text) pairs.
+    """
+
+    def __init__(self, load_chunks=None, k1=1.5, b=0.75):
+        self.load_chunks = load_chunks
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._docs = {}
+
+    def add(self, doc_id, chunk_ids, texts):
+        """Indexes the given chunks of doc_id. Chunks that are already indexed are skipped."""
+        with self._lock:
+            postings = self._docs.setdefault(doc_id, _DocumentPostings())
+            for chunk_id, text in zip(chunk_ids, texts):
+                if chunk_id not in postings.lengths:
+                    postings.add(chunk_id, text)
+
+    def _postings(self, doc_id):
+        with self._lock:
+            postings = self._docs.get(doc_id)
+        if postings is None and self.load_chunks is not None:
+            chunks = self.load_chunks(doc_id)
+            if chunks:
+                chunk_ids, texts = zip(*chunks)
+                self.add(doc_id, chunk_ids, texts)
+                print(f"Built BM25 index of document {doc_id} from {len(chunk_ids)} stored chunks.")
+            with self._lock:
+                postings = self._docs.get(doc_id)
+        return postings
+
+    def _score(self, postings, terms, scores):
+        count = len(postings.lengths)
+        if not count:
+            return
+        average_length = postings.total_length / count or 1
+        for term in terms:
+            entries = postings.postings.get(term)
+            if not entries:
+                continue
+            idf = math.log(1 + (count - len(entries) + 0.5) / (len(entries) + 0.5))
+            for chunk_id, tf in entries:
+                norm = self.k1 * (1 - self.b + self.b * postings.lengths[chunk_id] / average_length)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+    def search(self, query, k, doc_id=None):
+        """Returns up to k (chunk id, score) pairs, best first. Without doc_id all in-memory documents are searched."""
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        scores = {}
+        if doc_id is not None:
+            postings = self._postings(doc_id)
+            if postings is not None:
+                self._score(postings, terms, scores)
+        else:
+            with self._lock:
+                all_postings = list(self._docs.values())
+            for postings in all_postings:
+                self._score(postings, terms, scores)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def remove(self, doc_id):
+        with self._lock:
+            self._docs.pop(doc_id, None)
+
+
+def reciprocal_rank_fusion(rankings, k, rrf_k=60):
+    """Fuses ranked lists of ids: each id scores sum(1 / (rrf_k + rank)) over the lists. Returns the top k ids."""
+    scores = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (rrf_k + rank)
+    return [item for item, _ in sorted(scores.items(), key=lambda entry: entry[1], reverse=True)[:k]]
@@ -0,0 +1,241 @@
+# chunk_store.py
+import json
+import mmap
+import os
+import threading
+
+import numpy as np
+
+# One fixed-width row per chunk; the row number is the chunk's FAISS id.
+ROW_DTYPE = np.dtype([
+    ('offset', '<u8'),   # byte offset of the chunk text in the text blob
+    ('length', '<u4'),   # byte length of the UTF-8 chunk text
+    ('doc', '<u4'),      # index into the interned document id table
+    ('file', '<u4'),     # index into the interned source filename table
+])
+
+
+def _sync(f):
+    f.flush()
+    os.fsync(f.fileno())
+
+
+def _read_string_table(path):
+    """Reads an interned string table (one JSON string per line), dropping a torn last line."""
+    values = []
+    if not os.path.exists(path):
+        return values, 0
+    valid_size = 0
+    with open(path, 'rb') as f:
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            try:
+                values.append(json.loads(line))
+            except ValueError:
+                break
+            valid_size += len(line)
+    return values, valid_size
+
+
+class ChunkStore:
+    """
+    Append-only, columnar store of chunk records, memory-mapped for reads.
+
+    Chunk texts live in one contiguous UTF-8 blob, a fixed-width row file holds
+    each chunk's offset, length and interned document/filename ids, and two small
+    tables hold the distinct document ids and filenames. Looking up a chunk only
+    touches its row and its slice of the blob, so nothing is materialized at startup.
+
+    Rows are written last, so a row's presence on disk means its text and names
+    are already durable.
+
+    A read-only store (read_only=True) maps the same files for tools that inspect a
+    live index: it never truncates or appends, and simply ignores a torn tail.
+    """
+
+    def __init__(self, directory, prefix='chunks', read_only=False):
+        self.directory = directory
+        self.read_only = read_only
+        self._text_path = os.path.join(directory, f'{prefix}.txt')
+        self._rows_path = os.path.join(directory, f'{prefix}.rows')
+        self._docs_path = os.path.join(directory, f'{prefix}.docs')
+        self._files_path = os.path.join(directory, f'{prefix}.files')
+        self._append_lock = threading.Lock()
+        self._open()
+
+    def _open(self):
+        self._doc_ids, docs_size = _read_string_table(self._docs_path)
+        self._filenames, files_size = _read_string_table(self._files_path)
+        self._doc_lookup = {value: i for i, value in enumerate(self._doc_ids)}
+        self._file_lookup = {value: i for i, value in enumerate(self._filenames)}
+
+        for path, valid_size in ((self._docs_path, docs_size), (self._files_path, files_size)):
+            if not self.read_only and os.path.exists(path) and os.path.getsize(path) > valid_size:
+                with open(path, 'r+b') as f:
+                    f.truncate(valid_size)
+
+        text_size = os.path.getsize(self._text_path) if os.path.exists(self._text_path) else 0
+        rows_size = os.path.getsize(self._rows_path) if os.path.exists(self._rows_path) else 0
+        count = rows_size // ROW_DTYPE.itemsize
+        if count:
+            rows = np.memmap(self._rows_path, dtype=ROW_DTYPE, mode='r', shape=(count,))
+            # Drop rows whose text or names did not make it to disk before a crash.
+            ends = rows['offset'] + rows['length']
+            valid = (ends <= text_size) & (rows['doc'] < len(self._doc_ids)) & (rows['file'] < len(self._filenames))
+            if not valid.all():
+                count = int(np.argmin(valid))
+                if not self.read_only:
+                    print(f"Chunk store: dropping {len(rows) - count} incomplete rows.")
+            del rows
+        self._count = 0
+        if self.read_only:
+            self._remap(count)
+            return
+        self._truncate_files(count)
+
+        self._text_file = open(self._text_path, 'ab')
+        self._rows_file = open(self._rows_path, 'ab')
+        self._docs_file = open(self._docs_path, 'ab')
+        self._files_file = open(self._files_path, 'ab')
+        self._remap(count)
+
+    def _truncate_files(self, count):
+        rows_size = count * ROW_DTYPE.itemsize
+        if os.path.exists(self._rows_path) and os.path.getsize(self._rows_path) != rows_size:
+            with open(self._rows_path, 'r+b') as f:
+                f.truncate(rows_size)
+        text_size = 0
+        if count:
+            last = np.fromfile(self._rows_path, dtype=ROW_DTYPE, count=1, offset=(count - 1) * ROW_DTYPE.itemsize)[0]
+            text_size = int(last['offset']) + int(last['length'])
+        if os.path.exists(self._text_path) and os.path.getsize(self._text_path) > text_size:
+            with open(self._text_path, 'r+b') as f:
+                f.truncate(text_size)
+
+    def _remap(self, count):
+        """Maps the first count rows. Readers never look past self._count, so it is published last."""
+        # Old maps are not closed explicitly: concurrent readers may still hold them.
+        text_size = os.path.getsize(self._text_path) if os.path.exists(self._text_path) else 0
+        if text_size:
+            with open(self._text_path, 'rb') as f:
+                self._text = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._text = b''
+        if count:
+            self._rows = np.memmap(self._rows_path, dtype=ROW_DTYPE, mode='r', shape=(count,))
+        else:
+            self._rows = np.zeros(0, dtype=ROW_DTYPE)
+        self._count = count
+
+    # --- Writes ---
+    def _intern(self, value, table, lookup, table_file):
+        index = lookup.get(value)
+        if index is None:
+            index = len(table)
+            table_file.write(json.dumps(value).encode('utf-8') + b'\n')
+            table.append(value)
+            lookup[value] = index
+        return index
+
+    def append(self, records):
+        """
+        Appends chunk records ({'chunk_text', 'doc_id', 'source_filename'} dicts).
+        Returns the row id of the first appended record.
+        """
+        if self.read_only:
+            raise PermissionError(f"Chunk store in {self.directory} is read-only")
+        with self._append_lock:
+            start_row = self._count
+            if not records:
+                return start_row
+            rows = np.zeros(len(records), dtype=ROW_DTYPE)
+            offset = self._text_file.tell()
+            blobs = []
+            for i, record in enumerate(records):
+                data = record['chunk_text'].encode('utf-8')
+                rows[i] = (
+                    offset,
+                    len(data),
+                    self._intern(record['doc_id'], self._doc_ids, self._doc_lookup, self._docs_file),
+                    self._intern(record['source_filename'], self._filenames, self._file_lookup, self._files_file),
+                )
+                offset += len(data)
+                blobs.append(data)
+
+            self._text_file.write(b''.join(blobs))
+            for f in (self._text_file, self._docs_file, self._files_file):
+                _sync(f)
+            # The rows are the commit point.
+            self._rows_file.write(rows.tobytes())
+            _sync(self._rows_file)
+            self._remap(start_row + len(records))
+            return start_row
+
+    def truncate(self, count):
+        """Drops every row from count onwards."""
+        if self.read_only:
+            raise PermissionError(f"Chunk store in {self.directory} is read-only")
+        with self._append_lock:
+            if count >= self._count:
+                return
+            for f in (self._text_file, self._rows_file):
+                f.close()
+            self._count = count
+            self._truncate_files(count)
+            self._text_file = open(self._text_path, 'ab')
+            self._rows_file = open(self._rows_path, 'ab')
+            self._remap(count)
+
+    # --- Reads ---
+    def __len__(self):
+        return self._count
+
+    def __bool__(self):
+        return self._count > 0
+
+    def __contains__(self, row):
+        return 0 <= row < self._count
+
+    def text(self, row):
+        entry = self._rows[row]
+        start = int(entry['offset'])
+        return self._text[start:start + int(entry['length'])].decode('utf-8')
+
+    def doc_id(self, row):
+        return self._doc_ids[int(self._rows[row]['doc'])]
+
+    def __getitem__(self, row):
+        """Returns the chunk record at row in the same dict shape the pickled document store used."""
+        if row not in self:
+            raise KeyError(row)
+        entry = self._rows[row]
+        start = int(entry['offset'])
+        return {
+            'chunk_text': self._text[start:start + int(entry['length'])].decode('utf-8'),
+            'doc_id': self._doc_ids[int(entry['doc'])],
+            'source_filename': self._filenames[int(entry['file'])],
+        }
+
+    def get(self, row, default=None):
+        return self[row] if row in self else default
+
+    def doc_ranges(self):
+        """Returns doc_id -> list of [start, end) row ranges, computed from the doc column without per-row objects."""
+        ranges = {}
+        if not self._count:
+            return ranges
+        docs = np.asarray(self._rows['doc'])
+        boundaries = np.flatnonzero(np.diff(docs)) + 1
+        starts = np.concatenate(([0], boundaries))
+        ends = np.concatenate((boundaries, [self._count]))
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            ranges.setdefault(self._doc_ids[int(docs[start])], []).append([start, end])
+        return ranges
+
+    def close(self):
+        if self.read_only:
+            return
+        with self._append_lock:
+            for f in (self._text_file, self._rows_file, self._docs_file, self._files_file):
+                f.close()
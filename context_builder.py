@@ -0,0 +1,98 @@
+# context_builder.py
+import numpy as np
+
+from create_chunks import TOKENS_PER_WORD, estimate_tokens
+from embedding_cache import normalize_chunk_text
+
+CHUNK_SEPARATOR = "\n---\n"
+
+
+def mmr_order(candidate_ids, vectors, query_embedding, mmr_lambda=0.7):
+    """
+    Orders candidates by maximal marginal relevance: each next pick maximizes
+    mmr_lambda * similarity to the query - (1 - mmr_lambda) * max similarity to earlier picks,
+    so near-duplicate chunks are pushed back in favour of ones adding new information.
+    """
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    query = query_embedding / max(np.linalg.norm(query_embedding), 1e-12)
+    relevance = vectors @ query
+    similarity = vectors @ vectors.T
+
+    order = []
+    remaining = list(range(len(candidate_ids)))
+    redundancy = np.full(len(candidate_ids), -1.0, dtype='float32')
+    while remaining:
+        scores = [mmr_lambda * relevance[i] - (1 - mmr_lambda) * max(redundancy[i], 0.0) for i in remaining]
+        best = remaining.pop(int(np.argmax(scores)))
+        order.append(candidate_ids[best])
+        redundancy = np.maximum(redundancy, similarity[best])
+    return order
+
+
+def build_context(index_manager, ranked_ids, query_embedding=None, budget_tokens=3000, neighbours=1, mmr_lambda=0.7):
+    """
+    Assembles the context for a question from retrieved chunks without exceeding budget_tokens.
+
+    Chunks are taken in MMR order (retrieval order if no query embedding is given), each
+    together with up to `neighbours` adjacent chunks of the same document on either side
+    for continuity, skipping duplicates. The selected chunks are joined in document order.
+    Returns (context, selected FAISS ids).
+    """
+    if not ranked_ids:
+        return "", []
+    order = list(ranked_ids)
+    if query_embedding is not None and len(order) > 1 and 0 < mmr_lambda < 1:
+        try:
+            order = mmr_order(order, index_manager.vectors(order), np.asarray(query_embedding, dtype='float32'),
+                              mmr_lambda)
+        except Exception as e:
+            print(f"MMR reordering failed ({e}); using retrieval order.")
+
+    # Fetch every chunk that could be used (hits and their neighbours) in one call.
+    wanted = []
+    for idx in order:
+        wanted.extend(range(idx - neighbours, idx + neighbours + 1))
+    wanted = [idx for idx in dict.fromkeys(wanted) if idx >= 0]
+    records = dict(zip(wanted, index_manager.records(wanted)))
+
+    selected = {}
+    seen_texts = set()
+    used_tokens = 0
+    separator_tokens = estimate_tokens(CHUNK_SEPARATOR)
+    for idx in order:
+        hit = records.get(idx)
+        if hit is None:
+            continue
+        # The hit first, then its neighbours, nearest first.
+        group = [idx]
+        for distance in range(1, neighbours + 1):
+            group += [idx - distance, idx + distance]
+        for chunk_id in group:
+            record = records.get(chunk_id)
+            if chunk_id in selected or record is None or record['doc_id'] != hit['doc_id']:
+                continue
+            text_key = normalize_chunk_text(record['chunk_text'])
+            if text_key in seen_texts:
+                continue
+            tokens = estimate_tokens(record['chunk_text']) + separator_tokens
+            if used_tokens + tokens > budget_tokens:
+                if chunk_id == idx and not selected:
+                    # Even the best chunk alone is over budget: keep as much of it as fits.
+                    words = record['chunk_text'].split()[:int(budget_tokens / TOKENS_PER_WORD) - 1]
+                    selected[chunk_id] = " ".join(words)
+                    used_tokens = budget_tokens
+                continue
+            selected[chunk_id] = record['chunk_text']
+            seen_texts.add(text_key)
+            used_tokens += tokens
+        if used_tokens >= budget_tokens:
+            break
+
+    # FAISS ids of a document follow its page order.
+    ids = sorted(selected)
+    return CHUNK_SEPARATOR.join(selected[idx] for idx in ids), ids
+
+
+def truncate_to_budget(text, budget_tokens):
+    """The leading words of text that fit in budget_tokens."""
+    return " ".join(text.split()[:max(int(budget_tokens / TOKENS_PER_WORD) - 1, 0)])
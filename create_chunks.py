@@ -1,27 +1,139 @@
 #create_chunks.py
+import os
+
 import spacy
 
-# Load spaCy model (do this only once)
-nlp = spacy.load("en_core_web_sm")
+import model_registry
+
+# Average BPE tokens per whitespace-separated word for English text.
+TOKENS_PER_WORD = 1.3
+
+# Sentence segmenter used for chunking:
+#   senter      - en_core_web_sm's statistical sentence recognizer, with every other component excluded (default)
+#   sentencizer - spaCy's rule-based splitter on punctuation; fastest, needs no trained model
+SENTENCE_SEGMENTER = os.getenv("SENTENCE_SEGMENTER", "senter").lower()
+
+
+def _load_sentence_segmenter():
+    """
+    Loads a spaCy pipeline that only sets sentence boundaries. The tagger, parser and
+    NER of the full pipeline are never run, which makes segmentation several times faster.
+    """
+    if SENTENCE_SEGMENTER == "senter":
+        try:
+            nlp = spacy.load("en_core_web_sm",
+                             exclude=["tok2vec", "tagger", "parser", "attribute_ruler", "lemmatizer", "ner"])
+            nlp.enable_pipe("senter")
+            return nlp
+        except (OSError, ValueError) as e:
+            print(f"Could not load the senter component of en_core_web_sm ({e}); using the rule-based sentencizer.")
+    nlp = spacy.blank("en")
+    nlp.add_pipe("sentencizer")
+    return nlp
+
+
+# Loaded once per process, on first use (see model_registry)
+model_registry.register('sentence_segmenter', _load_sentence_segmenter)
+
+
+def get_nlp():
+    return model_registry.get('sentence_segmenter')
+
+
+def estimate_tokens(text):
+    """Approximates the number of model tokens in text from its word count."""
+    return int(len(text.split()) * TOKENS_PER_WORD) + 1
+
+
+def _iter_segments(texts):
+    """Yields the texts, cutting any text longer than nlp.max_length at paragraph breaks (or hard, as a last resort)."""
+    max_length = get_nlp().max_length
+    for text in texts:
+        if len(text) <= max_length:
+            yield text
+            continue
+        for paragraph in text.split("\n\n"):
+            for start in range(0, len(paragraph), max_length):
+                yield paragraph[start:start + max_length]
+
+
+def iter_sentences(texts, batch_size=32):
+    """
+    Yields the non-empty sentences of a stream of texts, segmenting them with nlp.pipe.
+    batch_size texts are buffered per spaCy batch; use 1 when texts arrive one at a time
+    and sentences are needed as soon as each text is available.
+    """
+    for doc in get_nlp().pipe(_iter_segments(texts), batch_size=batch_size):
+        for sent in doc.sents:
+            sentence = sent.text.strip()
+            if sentence:
+                yield sentence
+
 
 # Sentence tokenizer using spaCy
 def sent_tokenize_spacy(text):
-    doc = nlp(text)
-    return [sent.text.strip() for sent in doc.sents if sent.text.strip()]
+    return list(iter_sentences([text]))
+
+
+def _split_long_sentence(sentence, size, limit):
+    """Cuts a sentence that alone exceeds the chunk limit into word windows of about limit units."""
+    words = sentence.split()
+    words_per_piece = max(int(len(words) * limit / size), 1)
+    for start in range(0, len(words), words_per_piece):
+        yield " ".join(words[start:start + words_per_piece])
 
 
-def sentence_based_chunking(text, max_words=200):
-    sentences = sent_tokenize_spacy(text)
-    chunks = []
+def iter_sentence_chunks(texts, max_words=200, overlap=0, max_tokens=None, count_tokens=None, batch_size=32):
+    """
+    Incremental version of sentence_based_chunking for a stream of texts (e.g. OCR pages).
+    Yields each chunk as soon as it is complete; a chunk may span consecutive texts.
+
+    Chunks hold whole sentences up to max_words words, or up to max_tokens tokens as
+    measured by count_tokens (estimate_tokens by default) if max_tokens is given.
+    Each chunk after the first starts with up to `overlap` words (or tokens) of trailing
+    sentences from the previous chunk. Sentence sizes are counted once and kept as a
+    running total, so chunking is linear in the length of the input.
+    """
+    if max_tokens is not None:
+        limit = max_tokens
+        measure = count_tokens or estimate_tokens
+    else:
+        limit = max_words
+        measure = lambda sentence: len(sentence.split())
+
     current_chunk = []
+    current_sizes = []
+    current_size = 0
 
-    for sentence in sentences:
-        if len(" ".join(current_chunk + [sentence]).split()) <= max_words:
-            current_chunk.append(sentence)
+    for sentence in iter_sentences(texts, batch_size=batch_size):
+        size = measure(sentence)
+        if size <= limit:
+            pieces = [(sentence, size)]
         else:
-            chunks.append(" ".join(current_chunk))
-            current_chunk = [sentence]
+            pieces = [(piece, measure(piece)) for piece in _split_long_sentence(sentence, size, limit)]
+
+        for piece, piece_size in pieces:
+            if current_chunk and current_size + piece_size > limit:
+                yield " ".join(current_chunk)
+                # Carry trailing sentences over as overlap, leaving room for the new piece.
+                kept = 0
+                kept_size = 0
+                while kept < len(current_chunk):
+                    next_size = current_sizes[-1 - kept]
+                    if kept_size + next_size > overlap or kept_size + next_size + piece_size > limit:
+                        break
+                    kept += 1
+                    kept_size += next_size
+                current_chunk = current_chunk[len(current_chunk) - kept:]
+                current_sizes = current_sizes[len(current_sizes) - kept:]
+                current_size = kept_size
+            current_chunk.append(piece)
+            current_sizes.append(piece_size)
+            current_size += piece_size
 
     if current_chunk:
-        chunks.append(" ".join(current_chunk))
-    return chunks
\ No newline at end of file
+        yield " ".join(current_chunk)
+
+
+def sentence_based_chunking(text, max_words=200, overlap=0, max_tokens=None):
+    return list(iter_sentence_chunks([text], max_words=max_words, overlap=overlap, max_tokens=max_tokens))
@@ -0,0 +1,138 @@
+# document_registry.py
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+
+def _write_text_atomically(path, text):
+    """Writes text through a unique temporary file renamed over path, so readers never see a partial file."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix=f"{os.path.basename(path)}.",
+                                    suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def fingerprint_file(path, block_size=1024 * 1024):
+    """Returns the SHA-256 hex digest of the file's bytes."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class DocumentRegistry:
+    """
+    Persistent record of uploaded documents, looked up by document id or by file fingerprint.
+
+    Each document has a small JSON record (filename, fingerprint, summary, ...) and its
+    extracted text stored next to it, so processed documents survive a server restart
+    and an identical upload can be answered with the existing document.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._records = {}
+        self._by_fingerprint = {}
+        # Documents claimed by this process whose text has not been saved yet.
+        self._in_flight = set()
+        for name in os.listdir(directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(directory, name), 'r', encoding='utf-8') as f:
+                    record = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Skipping unreadable document record {name}: {e}")
+                continue
+            self._records[record['document_id']] = record
+            if record.get('fingerprint'):
+                self._by_fingerprint[record['fingerprint']] = record['document_id']
+
+    def _record_path(self, document_id):
+        return os.path.join(self.directory, f"{document_id}.json")
+
+    def _text_path(self, document_id):
+        return os.path.join(self.directory, f"{document_id}.txt")
+
+    def _write_record(self, record):
+        _write_text_atomically(self._record_path(record['document_id']), json.dumps(record))
+
+    def claim(self, fingerprint, document_id, filename):
+        """
+        Registers document_id for fingerprint unless another document already has it.
+        Returns the id of the document that owns the fingerprint; if that is not
+        document_id, the upload is a duplicate.
+
+        A document without saved text that is not being processed by this process
+        (e.g. one interrupted by a restart) never completes, so its claim is taken over.
+        """
+        with self._lock:
+            existing_id = self._by_fingerprint.get(fingerprint)
+            if existing_id is not None:
+                if existing_id in self._in_flight or os.path.exists(self._text_path(existing_id)):
+                    return existing_id
+                print(f"Document {existing_id} was never completed. Taking over its fingerprint.")
+                self._remove_locked(existing_id)
+            record = {
+                'document_id': document_id,
+                'filename': filename,
+                'fingerprint': fingerprint,
+                'summary': None,
+            }
+            self._records[document_id] = record
+            self._by_fingerprint[fingerprint] = document_id
+            self._in_flight.add(document_id)
+            self._write_record(record)
+            return document_id
+
+    def get(self, document_id):
+        with self._lock:
+            record = self._records.get(document_id)
+            return dict(record) if record else None
+
+    def update(self, document_id, **fields):
+        with self._lock:
+            record = self._records.get(document_id)
+            if record is None:
+                return
+            record.update(fields)
+            self._write_record(record)
+
+    def remove(self, document_id):
+        """Forgets a document, e.g. after its processing failed, so that a re-upload is processed again."""
+        with self._lock:
+            self._remove_locked(document_id)
+
+    def _remove_locked(self, document_id):
+        self._in_flight.discard(document_id)
+        record = self._records.pop(document_id, None)
+        if record is None:
+            return
+        if self._by_fingerprint.get(record.get('fingerprint')) == document_id:
+            del self._by_fingerprint[record['fingerprint']]
+        for path in (self._record_path(document_id), self._text_path(document_id)):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def save_text(self, document_id, text):
+        _write_text_atomically(self._text_path(document_id), text)
+        with self._lock:
+            self._in_flight.discard(document_id)
+
+    def load_text(self, document_id):
+        path = self._text_path(document_id)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
@@ -0,0 +1,122 @@
+# embedding_cache.py
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+import numpy as np
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_chunk_text(text):
+    """Normalization applied before hashing, so re-extracted text with different spacing still hits."""
+    return _WHITESPACE_RE.sub(' ', unicodedata.normalize('NFC', text)).strip()
+
+
+class EmbeddingCache:
+    """
+    Persistent, content-addressed cache of chunk embeddings.
+
+    Entries are keyed by a hash of the embedding model name and the normalized chunk
+    text and hold the float32 vector. The cache is bounded to max_entries; when it
+    grows past that, the least recently used entries are evicted.
+    """
+
+    def __init__(self, path, model_name, max_entries=500000):
+        self.path = path
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # The SQLite connection is opened on first use.
+        self._conn = None
+        self._count = 0
+
+    def _connection(self):
+        """The SQLite connection, opened on first use. Must be called with _lock held."""
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS embeddings ('
+                ' key BLOB PRIMARY KEY,'
+                ' vector BLOB NOT NULL,'
+                ' last_used REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)')
+            conn.commit()
+            self._count = conn.execute('SELECT COUNT(*) FROM embeddings').fetchone()[0]
+            self._conn = conn
+        return self._conn
+
+    def key(self, text):
+        data = f"{self.model_name}\0{normalize_chunk_text(text)}".encode('utf-8')
+        return hashlib.sha256(data).digest()
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        return {
+            'entries': self._count,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hit_rate,
+        }
+
+    def get_many(self, keys):
+        """Returns a list with the cached vector for each key, or None where the key is not cached."""
+        found = {}
+        unique_keys = list(dict.fromkeys(keys))
+        with self._lock:
+            conn = self._connection()
+            # Stay well below SQLite's limit on bound parameters.
+            for i in range(0, len(unique_keys), 500):
+                batch = unique_keys[i:i + 500]
+                placeholders = ','.join('?' * len(batch))
+                rows = conn.execute(
+                    f'SELECT key, vector FROM embeddings WHERE key IN ({placeholders})', batch
+                ).fetchall()
+                for key, vector in rows:
+                    found[key] = np.frombuffer(vector, dtype='float32')
+            if found:
+                now = time.time()
+                conn.executemany('UPDATE embeddings SET last_used = ? WHERE key = ?',
+                                       [(now, key) for key in found])
+                conn.commit()
+            results = [found.get(key) for key in keys]
+            hits = sum(1 for vector in results if vector is not None)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return results
+
+    def put_many(self, keys, vectors):
+        """Stores one float32 vector per key and evicts the least recently used entries if over budget."""
+        if not keys:
+            return
+        now = time.time()
+        rows = [(key, np.asarray(vector, dtype='float32').tobytes(), now) for key, vector in zip(keys, vectors)]
+        with self._lock:
+            conn = self._connection()
+            before = conn.total_changes
+            conn.executemany('INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)', rows)
+            self._count += conn.total_changes - before
+            if self._count > self.max_entries:
+                # Evict down to 90% of the budget so eviction does not run on every insert.
+                excess = self._count - int(self.max_entries * 0.9)
+                conn.execute(
+                    'DELETE FROM embeddings WHERE key IN '
+                    '(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)', (excess,)
+                )
+                self._count -= excess
+            conn.commit()
@@ -1,12 +1,12 @@
 # flashcard_generator.py
 import os
 import json
-import google.generativeai as genai
 from dotenv import load_dotenv
 
+from llm_client import generate_content
+
 load_dotenv()
 
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
 FLASHCARD_MODEL_NAME = "models/gemini-1.5-flash-latest"
 
 def generate_flashcards(summary_text, max_output_tokens=1500):
@@ -18,8 +18,6 @@ def generate_flashcards(summary_text, max_output_tokens=1500):
         print("Error: GEMINI_API_KEY is not set for flashcard generation.")
         return []
 
-    model = genai.GenerativeModel(FLASHCARD_MODEL_NAME)
-
     prompt = f"""
     Based on the following document summary, identify the most important key concepts or facts.
     For each key concept, generate a concise statement for the front of a flashcard and a short,
@@ -49,14 +47,14 @@ def generate_flashcards(summary_text, max_output_tokens=1500):
     """
 
     try:
-        response = model.generate_content(
+        response = generate_content(
             prompt,
-            generation_config=genai.types.GenerationConfig(
+            model_name=FLASHCARD_MODEL_NAME,
+            generation_config=dict(
                 temperature=0.3, 
                 max_output_tokens=max_output_tokens,
                 response_mime_type="application/json" 
             ),
-            # safety_settings=genai.types.SafetySetting(...) 
         )
 
         generated_json_text = response.text.strip()
@@ -0,0 +1,113 @@
+# index_log.py
+import os
+import pickle
+import struct
+import zlib
+
+import numpy as np
+
+# Each record on disk is: magic | payload length | crc32 of payload | payload.
+# A record only counts once it has been completely written, so a crash mid-append
+# leaves at most a torn tail that is dropped on the next load.
+_RECORD_MAGIC = b'AKWL'
+_RECORD_HEADER = struct.Struct('<4sQI')
+# Payload of a batch record: first FAISS id | number of vectors | dimension | vectors | pickled records.
+# Chunk records are kept in the chunk store, so new batches log an empty record list; older logs
+# still carry the records and are migrated on replay.
+_BATCH_HEADER = struct.Struct('<qII')
+
+
+def encode_batch(start_id, embeddings, records=()):
+    """Serializes one batch of added vectors and, optionally, their chunk records."""
+    embeddings = np.ascontiguousarray(embeddings, dtype='float32')
+    count, dimension = embeddings.shape
+    return (
+        _BATCH_HEADER.pack(start_id, count, dimension)
+        + embeddings.tobytes()
+        + pickle.dumps(list(records))
+    )
+
+
+def decode_batch(payload):
+    """Inverse of encode_batch. Returns (start_id, embeddings, records)."""
+    start_id, count, dimension = _BATCH_HEADER.unpack_from(payload, 0)
+    vectors_end = _BATCH_HEADER.size + count * dimension * 4
+    embeddings = np.frombuffer(payload, dtype='float32', count=count * dimension, offset=_BATCH_HEADER.size)
+    records = pickle.loads(payload[vectors_end:])
+    return start_id, embeddings.reshape(count, dimension), records
+
+
+def iter_log_records(path):
+    """
+    Yields (end_offset, payload) for every complete, checksum-valid record in the log at path.
+    Stops silently at the first torn or corrupt record.
+    """
+    with open(path, 'rb') as f:
+        offset = 0
+        while True:
+            header = f.read(_RECORD_HEADER.size)
+            if len(header) < _RECORD_HEADER.size:
+                return
+            magic, length, checksum = _RECORD_HEADER.unpack(header)
+            if magic != _RECORD_MAGIC:
+                print(f"Corrupt record header in {path} at offset {offset}. Ignoring the rest of the log.")
+                return
+            payload = f.read(length)
+            if len(payload) < length or zlib.crc32(payload) != checksum:
+                print(f"Incomplete record in {path} at offset {offset}. Ignoring the rest of the log.")
+                return
+            offset += _RECORD_HEADER.size + length
+            yield offset, payload
+
+
+class AppendOnlyLog:
+    """An append-only file of checksummed records, fsynced after every append."""
+
+    def __init__(self, path, valid_size=None):
+        self.path = path
+        # Drop a torn tail left behind by a crash so new records follow the last good one.
+        if valid_size is not None and os.path.exists(path) and os.path.getsize(path) > valid_size:
+            with open(path, 'r+b') as f:
+                f.truncate(valid_size)
+        self._file = open(path, 'ab')
+
+    @property
+    def size(self):
+        return self._file.tell() if self._file is not None else os.path.getsize(self.path)
+
+    def append(self, payload):
+        if self._file is None:
+            raise OSError(f"Log {self.path} is unusable: a failed append could not be rolled back.")
+        start = self._file.tell()
+        try:
+            self._file.write(_RECORD_HEADER.pack(_RECORD_MAGIC, len(payload), zlib.crc32(payload)))
+            self._file.write(payload)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        except BaseException:
+            self._rollback(start)
+            raise
+
+    def _rollback(self, size):
+        """
+        Cuts a partially written record off the end of the log, so that the next record
+        follows the last good one instead of torn bytes that would end replay early.
+        """
+        try:
+            self._file.close()
+        except OSError:
+            # Buffered bytes that could not be flushed are discarded with the file object.
+            pass
+        self._file = None
+        try:
+            with open(self.path, 'r+b') as f:
+                f.truncate(size)
+                f.flush()
+                os.fsync(f.fileno())
+            self._file = open(self.path, 'ab')
+        except OSError as e:
+            print(f"Failed to roll back a partial append to {self.path}: {e}. Refusing further appends.")
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
@@ -0,0 +1,636 @@
+# index_manager.py
+import json
+import os
+import pickle
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+import faiss
+import numpy as np
+
+from ann_index import default_nlist, index_type_of, min_training_vectors, promote_index, set_search_params
+from chunk_store import ChunkStore
+from index_log import AppendOnlyLog, decode_batch, encode_batch, iter_log_records
+
+
+class IndexLoadError(Exception):
+    """Raised when the stored index cannot be loaded without losing data."""
+
+
+# --- Reader/Writer Lock ---
+class ReadWriteLock:
+    """
+    Allows many concurrent readers or a single writer.
+    Waiting writers block new readers so that uploads are not starved by queries.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    def acquire_read(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+
+    def release_read(self):
+        with self._cond:
+            self._readers -= 1
+            if self._readers == 0:
+                self._cond.notify_all()
+
+    def acquire_write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+
+    def release_write(self):
+        with self._cond:
+            self._writer = False
+            self._cond.notify_all()
+
+    @contextmanager
+    def read_locked(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write_locked(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+
+def _write_atomically(path, data):
+    """Writes data to a temporary file and renames it over path, so readers never see a partial file."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix=f"{os.path.basename(path)}.",
+                                    suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _flat_vectors(index):
+    """A zero-copy (ntotal, d) view of the vectors stored in a flat index; valid until the index changes."""
+    return faiss.rev_swig_ptr(index.get_xb(), index.ntotal * index.d).reshape(index.ntotal, index.d)
+
+
+def _exact_knn(vectors, ids, query_embeddings, k):
+    """Exact k-nearest search among vectors, whose FAISS ids are ids."""
+    D, local = faiss.knn(query_embeddings, vectors, k)
+    return D, np.where(local >= 0, ids[np.maximum(local, 0)], -1)
+
+
+# Document-scoped searches scan the document's exact vectors up to this many vectors: for
+# documents of ordinary size that is both faster and more accurate than a filtered ANN search.
+SCOPED_EXACT_MAX_VECTORS = 20000
+
+
+def _exact_vectors(index, ranges):
+    """The exact stored vectors of the given ranges, or None if the index does not keep exact vectors."""
+    if isinstance(index, faiss.IndexFlat):
+        vectors = _flat_vectors(index)
+    elif isinstance(index, faiss.IndexHNSWFlat):
+        vectors = _flat_vectors(faiss.downcast_index(index.storage))
+    elif isinstance(index, faiss.IndexIVFFlat):
+        try:
+            return np.vstack([index.reconstruct_n(int(start), int(end - start)) for start, end in ranges])
+        except RuntimeError:
+            # No direct map to reconstruct from.
+            return None
+    else:
+        # PQ codes only approximate the vectors.
+        return None
+    if len(ranges) == 1:
+        return vectors[ranges[0][0]:ranges[0][1]]
+    return np.vstack([vectors[start:end] for start, end in ranges])
+
+
+def search_ranges(index, query_embeddings, k, ranges, nprobe=16, ef_search=64,
+                  exact_max=SCOPED_EXACT_MAX_VECTORS):
+    """
+    Search restricted to the given [start, end) id ranges of index (a document's vectors).
+
+    Up to exact_max vectors are scanned exactly when the index keeps exact vectors (flat,
+    HNSW and IVF-Flat). Larger documents, and IVF-PQ indexes, are searched through the index
+    with an id selector, so they get the same index and distances as an unscoped search.
+    Should that find fewer than k of the document's vectors for some query (the vectors lie
+    outside the probed lists, or the HNSW walk leaves the filtered region), the search is
+    repeated exhaustively.
+    """
+    ids = np.concatenate([np.arange(start, end, dtype='int64') for start, end in ranges])
+    k = min(k, len(ids))
+    vectors = _exact_vectors(index, ranges) if len(ids) <= exact_max else None
+    if vectors is not None:
+        return _exact_knn(vectors, ids, query_embeddings, k)
+
+    if len(ranges) == 1:
+        selector = faiss.IDSelectorRange(int(ranges[0][0]), int(ranges[0][1]))
+    else:
+        selector = faiss.IDSelectorBatch(ids)
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        params = faiss.SearchParametersIVF(sel=selector, nprobe=min(nprobe, ivf.nlist))
+    else:
+        params = faiss.SearchParametersHNSW(sel=selector, efSearch=max(ef_search, k))
+    D, I = index.search(query_embeddings, k, params=params)
+    if (I >= 0).sum(axis=1).min() >= k:
+        return D, I
+
+    if ivf is not None:
+        return index.search(query_embeddings, k, params=faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nlist))
+    return _exact_knn(_exact_vectors(index, ranges), ids, query_embeddings, k)
+
+
+def _extend_doc_ranges(doc_ranges, doc_id, start, end):
+    """Records that ids [start, end) belong to doc_id, merging with the document's last range when adjacent."""
+    ranges = doc_ranges.setdefault(doc_id, [])
+    if ranges and ranges[-1][1] == start:
+        ranges[-1][1] = end
+    else:
+        ranges.append([start, end])
+
+
+class _PendingAdd:
+    """A batch waiting in the write queue, completed by whichever writer commits it."""
+
+    def __init__(self, embeddings, records):
+        self.embeddings = embeddings
+        self.records = records
+        self.start_id = None
+        self.error = None
+        self.done = threading.Event()
+
+
+# --- Global Index Manager ---
+class GlobalIndexManager:
+    """
+    Keeps the global FAISS index and document store resident in memory.
+    The index is loaded from disk once per process, searches are served from memory
+    under a shared read lock and adds are applied in place under an exclusive write lock.
+
+    On disk the vectors are a snapshot plus an append-only log of added batches:
+    every add appends only the new vectors to the log, and a background thread
+    periodically compacts the log into a fresh snapshot. Chunk records live in an
+    append-only, memory-mapped ChunkStore whose row numbers are the FAISS ids.
+
+    The index starts as an exact IndexFlatL2. If index_type names an approximate
+    index (see ann_index.INDEX_TYPES), the same background thread trains one and
+    swaps it in once the store holds promotion_threshold vectors.
+
+    Adds go through a single-writer queue with group commit: batches submitted while
+    another commit is in progress are coalesced and written by the next writer as one
+    chunk store append, one fsync'd log record and one FAISS add.
+    """
+
+    MANIFEST_NAME = 'manifest.json'
+
+    def __init__(self, index_dir, dimension_fn, legacy_index_path=None, legacy_doc_store_path=None,
+                 compaction_threshold_bytes=64 * 1024 * 1024, index_type='flat',
+                 promotion_threshold=100000, nprobe=16, ef_search=64):
+        self.index_dir = index_dir
+        self.legacy_index_path = legacy_index_path
+        self.legacy_doc_store_path = legacy_doc_store_path
+        self.compaction_threshold_bytes = compaction_threshold_bytes
+        self.index_type = index_type
+        self.promotion_threshold = promotion_threshold
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self._dimension_fn = dimension_fn
+
+        self._lock = ReadWriteLock()
+        self._load_lock = threading.Lock()
+        # Serializes appends to the log so that FAISS ids are assigned in log order.
+        self._append_lock = threading.Lock()
+        self._pending_lock = threading.Lock()
+        self._pending = []
+        self._compaction_lock = threading.Lock()
+        self._maintenance_requested = threading.Event()
+        self._compaction_due = False
+
+        self._index = None
+        self._chunk_store = None
+        # doc_id -> list of [start, end) FAISS id ranges holding that document's chunks.
+        self._doc_ranges = {}
+        self._log = None
+        self._log_generation = 0
+        self._log_bytes = 0
+        self._maintenance_thread = None
+
+    @property
+    def loaded(self):
+        return self._index is not None
+
+    def ensure_loaded(self):
+        """Loads the snapshot and replays the log on first use."""
+        if self._index is not None:
+            return
+        with self._load_lock:
+            if self._index is not None:
+                return
+            index, chunk_store = self._load_from_disk()
+            doc_ranges = chunk_store.doc_ranges()
+            with self._lock.write_locked():
+                self._chunk_store = chunk_store
+                self._doc_ranges = doc_ranges
+                self._index = index
+            self._start_maintenance()
+
+    # --- On-disk layout ---
+    def _path(self, name):
+        return os.path.join(self.index_dir, name)
+
+    def _snapshot_path(self, generation):
+        return self._path(f'snapshot_{generation:06d}.index')
+
+    def _legacy_snapshot_doc_store_path(self, generation):
+        # Snapshots written before the chunk store existed pickled the document store next to the index.
+        return self._path(f'snapshot_{generation:06d}.pkl')
+
+    def _log_path(self, generation):
+        return self._path(f'wal_{generation:06d}.log')
+
+    def _generations(self, prefix, suffix):
+        generations = []
+        for name in os.listdir(self.index_dir):
+            if name.startswith(prefix) and name.endswith(suffix):
+                try:
+                    generations.append(int(name[len(prefix):-len(suffix)]))
+                except ValueError:
+                    continue
+        return sorted(generations)
+
+    def _read_manifest(self):
+        manifest_path = self._path(self.MANIFEST_NAME)
+        if not os.path.exists(manifest_path):
+            return None
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _load_from_disk(self):
+        index = None
+        legacy_doc_store = None
+        generation = 0
+        migrate_legacy = False
+        chunk_store = ChunkStore(self.index_dir)
+
+        try:
+            manifest = self._read_manifest()
+        except (OSError, ValueError) as e:
+            raise IndexLoadError(f"The manifest in {self.index_dir} cannot be read ({e}). Refusing to start "
+                                 f"rather than discarding the stored index; restore it from a backup.") from e
+        try:
+            if manifest is not None:
+                generation = manifest['generation']
+                index = faiss.read_index(self._snapshot_path(generation))
+                legacy_path = self._legacy_snapshot_doc_store_path(generation)
+                if os.path.exists(legacy_path):
+                    with open(legacy_path, 'rb') as f:
+                        legacy_doc_store = pickle.load(f)
+                print(f"Global FAISS snapshot {generation} loaded ({index.ntotal} vectors).")
+            elif (self.legacy_index_path and os.path.exists(self.legacy_index_path)
+                    and self.legacy_doc_store_path and os.path.exists(self.legacy_doc_store_path)):
+                index = faiss.read_index(self.legacy_index_path)
+                with open(self.legacy_doc_store_path, 'rb') as f:
+                    legacy_doc_store = pickle.load(f)
+                migrate_legacy = True
+                print("Legacy global FAISS index and document store loaded. They will be compacted into a snapshot.")
+        except Exception as e:
+            # Starting empty would replay nothing and then truncate the log and chunk store to match.
+            raise IndexLoadError(f"The FAISS snapshot in {self.index_dir} cannot be loaded ({e}). Refusing to "
+                                 f"start rather than discarding the stored index; restore it from a backup.") from e
+
+        if index is None:
+            if manifest is None and len(chunk_store) and not self._generations('wal_', '.log'):
+                raise IndexLoadError(f"{self.index_dir} has chunk records but no snapshot or log. Refusing to "
+                                     f"start rather than discarding them; restore the index files.")
+            print("No existing FAISS snapshot found. Initializing new index.")
+            index = faiss.IndexFlatL2(self._dimension_fn())
+
+        if legacy_doc_store is not None and len(chunk_store) < index.ntotal:
+            self._import_doc_store(chunk_store, legacy_doc_store, index.ntotal)
+            migrate_legacy = True
+
+        active_generation, valid_size = self._replay_logs(index, chunk_store, generation)
+        self._log = AppendOnlyLog(self._log_path(active_generation), valid_size=valid_size)
+        self._log_generation = active_generation
+
+        if len(chunk_store) > index.ntotal:
+            # Chunk records are written before their vectors are logged; drop records whose vectors never made it.
+            print(f"Dropping {len(chunk_store) - index.ntotal} chunk records without vectors.")
+            chunk_store.truncate(index.ntotal)
+        elif len(chunk_store) < index.ntotal:
+            print(f"Warning: {index.ntotal - len(chunk_store)} vectors have no chunk record and will be skipped in results.")
+
+        set_search_params(index, nprobe=self.nprobe, ef_search=self.ef_search)
+        self._compaction_due = migrate_legacy or self._log_bytes >= self.compaction_threshold_bytes
+        if self._compaction_due or self._promotion_due(index):
+            self._maintenance_requested.set()
+        return index, chunk_store
+
+    @staticmethod
+    def _import_doc_store(chunk_store, doc_store, ntotal):
+        """Copies records of a pickled document store into the chunk store, keeping FAISS ids dense."""
+        placeholder = {'chunk_text': '', 'doc_id': '', 'source_filename': ''}
+        records = [doc_store.get(faiss_id, placeholder) for faiss_id in range(len(chunk_store), ntotal)]
+        chunk_store.append(records)
+        print(f"Imported {len(records)} records from the pickled document store into the chunk store.")
+
+    def _replay_logs(self, index, chunk_store, snapshot_generation):
+        """
+        Re-applies logged batches newer than the snapshot.
+        Returns the generation to keep appending to and its last valid offset.
+        """
+        generations = [g for g in self._generations('wal_', '.log') if g >= snapshot_generation]
+        if not generations:
+            return snapshot_generation, None
+
+        valid_size = None
+        replayed = 0
+        for generation in generations:
+            valid_size = 0
+            for end_offset, payload in iter_log_records(self._log_path(generation)):
+                start_id, embeddings, records = decode_batch(payload)
+                count = len(embeddings)
+                if start_id + count <= index.ntotal:
+                    # Already part of the snapshot (logged before the compaction that wrote it).
+                    valid_size = end_offset
+                    continue
+                if start_id != index.ntotal:
+                    # Vectors are missing (e.g. a lost snapshot); truncating here would discard every later batch.
+                    raise IndexLoadError(f"Gap in FAISS log {generation} at id {start_id} (expected {index.ntotal}). "
+                                         f"Refusing to start rather than discarding logged vectors.")
+                if records and len(chunk_store) < start_id + count:
+                    # Logs written before the chunk store existed carry the chunk records themselves.
+                    chunk_store.append(records[len(chunk_store) - start_id:])
+                index.add(embeddings)
+                replayed += count
+                valid_size = end_offset
+            self._log_bytes += valid_size
+        if replayed:
+            print(f"Replayed {replayed} logged vectors into the global FAISS index.")
+        return generations[-1], valid_size
+
+    @contextmanager
+    def reading(self):
+        """Yields (index, chunk_store) under the shared read lock."""
+        self.ensure_loaded()
+        with self._lock.read_locked():
+            yield self._index, self._chunk_store
+
+    @property
+    def ntotal(self):
+        with self.reading() as (index, _):
+            return index.ntotal
+
+    # --- Writes ---
+    def add(self, embeddings, records):
+        """
+        Appends the chunk records to the chunk store and the embeddings to the log,
+        then applies them to the in-memory index.
+        Blocks until the batch is committed and returns the FAISS id assigned to its first record.
+        """
+        self.ensure_loaded()
+        pending = _PendingAdd(np.ascontiguousarray(embeddings, dtype='float32'), records)
+        with self._pending_lock:
+            self._pending.append(pending)
+        with self._append_lock:
+            # A writer that held the lock before us may already have committed our batch.
+            if not pending.done.is_set():
+                self._commit_pending()
+        if pending.error is not None:
+            raise pending.error
+        return pending.start_id
+
+    def _commit_pending(self):
+        """Commits every queued batch as one write. Must be called with _append_lock held."""
+        with self._pending_lock:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return
+        start_id = self._index.ntotal
+        logged = False
+        try:
+            if len(batch) == 1:
+                embeddings = batch[0].embeddings
+            else:
+                embeddings = np.vstack([pending.embeddings for pending in batch])
+            records = [record for pending in batch for record in pending.records]
+            self._chunk_store.append(records)
+            payload = encode_batch(start_id, embeddings)
+            self._log.append(payload)
+            logged = True
+            self._log_bytes += len(payload)
+            with self._lock.write_locked():
+                self._index.add(embeddings)
+                for i, record in enumerate(records):
+                    _extend_doc_ranges(self._doc_ranges, record['doc_id'], start_id + i, start_id + i + 1)
+            next_id = start_id
+            for pending in batch:
+                pending.start_id = next_id
+                next_id += len(pending.embeddings)
+            if self._log_bytes >= self.compaction_threshold_bytes:
+                self._compaction_due = True
+            if self._compaction_due or self._promotion_due(self._index):
+                self._maintenance_requested.set()
+        except Exception as e:
+            if not logged:
+                # The batch never reached the log: drop its chunk records so that
+                # chunk store rows keep lining up with FAISS ids.
+                self._chunk_store.truncate(start_id)
+            for pending in batch:
+                pending.error = e
+            raise
+        finally:
+            for pending in batch:
+                pending.done.set()
+
+    # --- Reads ---
+    def search(self, query_embeddings, k, doc_id=None):
+        """
+        Searches the in-memory index for each row of query_embeddings.
+        If doc_id is given, only that document's vectors are scored, so the cost
+        scales with the size of the document rather than the whole store.
+        Returns one list of (faiss_id, distance, record) tuples per query row.
+        """
+        with self.reading() as (index, chunk_store):
+            if index.ntotal == 0 or not chunk_store:
+                return [[] for _ in range(len(query_embeddings))]
+            if doc_id is None:
+                D, I = index.search(query_embeddings, k)
+            else:
+                ranges = self._doc_ranges.get(doc_id)
+                if not ranges:
+                    return [[] for _ in range(len(query_embeddings))]
+                D, I = self._search_ranges(index, np.ascontiguousarray(query_embeddings, dtype='float32'), k, ranges)
+            results = []
+            for distances, ids in zip(D, I):
+                hits = []
+                for dist, idx in zip(distances, ids):
+                    idx = int(idx)
+                    if idx != -1 and idx in chunk_store:
+                        hits.append((idx, float(dist), chunk_store[idx]))
+                results.append(hits)
+            return results
+
+    def _search_ranges(self, index, query_embeddings, k, ranges):
+        return search_ranges(index, query_embeddings, k, ranges, nprobe=self.nprobe, ef_search=self.ef_search)
+
+    def records(self, faiss_ids):
+        """Returns the chunk records of the given FAISS ids (None for unknown ids)."""
+        with self.reading() as (_, chunk_store):
+            return [chunk_store[idx] if idx in chunk_store else None for idx in faiss_ids]
+
+    def vectors(self, faiss_ids):
+        """Returns the stored vectors of the given FAISS ids (approximate for PQ indexes)."""
+        with self.reading() as (index, _):
+            return np.vstack([index.reconstruct(int(idx)) for idx in faiss_ids])
+
+    def document_chunks(self, doc_id):
+        """Returns the (faiss_id, chunk text) pairs of a document, in id order."""
+        with self.reading() as (_, chunk_store):
+            return [
+                (idx, chunk_store.text(idx))
+                for start, end in self._doc_ranges.get(doc_id, [])
+                for idx in range(start, end)
+            ]
+
+    def document_ids(self):
+        """Returns the ids of all documents that have chunks in the index."""
+        with self.reading():
+            return list(self._doc_ranges)
+
+    # --- Approximate index promotion ---
+    def _promotion_due(self, index):
+        if self.index_type == 'flat' or index_type_of(index) != 'flat':
+            return False
+        ntotal = index.ntotal
+        return ntotal >= max(self.promotion_threshold, min_training_vectors(self.index_type, default_nlist(ntotal)))
+
+    def set_search_params(self, nprobe=None, ef_search=None):
+        """Changes the recall/latency trade-off of the approximate index at runtime."""
+        if nprobe is not None:
+            self.nprobe = nprobe
+        if ef_search is not None:
+            self.ef_search = ef_search
+        self.ensure_loaded()
+        with self._lock.write_locked():
+            set_search_params(self._index, nprobe=self.nprobe, ef_search=self.ef_search)
+
+    def promote(self):
+        """
+        Migrates the flat index to the configured approximate index type.
+        Training and bulk insertion happen without blocking searches or adds;
+        only the final catch-up of vectors added meanwhile holds the writers back.
+        """
+        self.ensure_loaded()
+        with self._compaction_lock:
+            with self._lock.read_locked():
+                if not self._promotion_due(self._index):
+                    return
+                trained_count = self._index.ntotal
+                dimension = self._index.d
+                vectors = self._index.reconstruct_n(0, trained_count)
+
+            print(f"Promoting global FAISS index to {self.index_type} ({trained_count} vectors)...")
+            started = time.time()
+            new_index = promote_index(vectors, self.index_type, dimension)
+            del vectors
+
+            with self._append_lock:
+                current_count = self._index.ntotal
+                if current_count > trained_count:
+                    new_index.add(self._index.reconstruct_n(trained_count, current_count - trained_count))
+                set_search_params(new_index, nprobe=self.nprobe, ef_search=self.ef_search)
+                with self._lock.write_locked():
+                    self._index = new_index
+                self._compaction_due = True
+            print(f"Global FAISS index promoted to {self.index_type} in {time.time() - started:.1f}s.")
+
+    # --- Background maintenance ---
+    def _start_maintenance(self):
+        if self._maintenance_thread is not None:
+            return
+        self._maintenance_thread = threading.Thread(target=self._maintenance_loop, name="faiss-maintenance", daemon=True)
+        self._maintenance_thread.start()
+
+    def _maintenance_loop(self):
+        while True:
+            self._maintenance_requested.wait()
+            self._maintenance_requested.clear()
+            try:
+                if self._promotion_due(self._index):
+                    self.promote()
+                if self._compaction_due:
+                    self.compact()
+            except Exception as e:
+                print(f"Error during global FAISS index maintenance: {e}")
+
+    def compact(self):
+        """
+        Writes a new snapshot of the in-memory index and document store and
+        deletes the log files it supersedes.
+        """
+        self.ensure_loaded()
+        with self._compaction_lock:
+            # Start a new log first; anything appended from now on is replayed on top of the snapshot.
+            with self._append_lock:
+                generation = self._log_generation + 1
+                self._log.close()
+                self._log = AppendOnlyLog(self._log_path(generation))
+                self._log_generation = generation
+                self._log_bytes = 0
+                self._compaction_due = False
+
+            with self._lock.read_locked():
+                index_bytes = faiss.serialize_index(self._index)
+                ntotal = self._index.ntotal
+
+            _write_atomically(self._snapshot_path(generation), index_bytes.tobytes())
+            # The manifest switch is the commit point of the compaction.
+            manifest = json.dumps({'generation': generation, 'ntotal': ntotal}).encode('utf-8')
+            _write_atomically(self._path(self.MANIFEST_NAME), manifest)
+
+            for old in self._generations('wal_', '.log'):
+                if old < generation:
+                    os.remove(self._log_path(old))
+            for old in self._generations('snapshot_', '.index'):
+                if old < generation:
+                    for path in (self._snapshot_path(old), self._legacy_snapshot_doc_store_path(old)):
+                        if os.path.exists(path):
+                            os.remove(path)
+            print(f"Global FAISS index compacted into snapshot {generation} ({ntotal} vectors).")
+
+
+def read_snapshot(index_dir):
+    """
+    Reads the snapshot named in the manifest of index_dir, read-only and without replaying the
+    log or touching any file, so tools can run next to a live server. Vectors logged since the
+    snapshot are not included. Returns None if there is no snapshot yet.
+    """
+    manifest_path = os.path.join(index_dir, GlobalIndexManager.MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        generation = json.load(f)['generation']
+    return faiss.read_index(os.path.join(index_dir, f'snapshot_{generation:06d}.index'), faiss.IO_FLAG_READ_ONLY)
@@ -0,0 +1,178 @@
+# ingestion_pipeline.py
+import queue
+import threading
+
+from create_chunks import iter_sentence_chunks
+from mistral_response import add_embeddings_to_global_faiss, embed_chunks_batched, iter_pages_with_ocr
+
+# Marks the end of a stage's output.
+_DONE = object()
+
+
+class PipelineStopped(Exception):
+    """Raised inside a stage when another stage failed and the pipeline is shutting down."""
+
+
+class PipelineCancelled(Exception):
+    """Raised by IngestionPipeline.run() when the pipeline was cancelled."""
+
+
+class IngestionPipeline:
+    """
+    Streams one PDF through OCR page -> sentence split and chunk -> embed -> index.
+
+    Each stage runs in its own thread and hands its output to the next through a
+    bounded queue, so a page's chunks become searchable while later pages are still
+    being OCR'd, and only a few pages and chunk batches are in flight at a time.
+    If a job_status.DocumentJob is given, stage states, timings and counters are reported to it.
+    If embed_pool (a job_scheduler.WorkerPool) is given, embedding runs on that shared pool
+    so that concurrent documents do not all compete for the CPU at once.
+    """
+
+    def __init__(self, document_id, pdf_path, original_filename, max_words=200,
+                 embed_batch_size=32, queue_size=4, on_page=None, job=None, embed_pool=None, priority=0):
+        self.document_id = document_id
+        self.pdf_path = pdf_path
+        self.original_filename = original_filename
+        self.max_words = max_words
+        self.embed_batch_size = embed_batch_size
+        self.on_page = on_page
+        self.job = job
+        self.embed_pool = embed_pool
+        self.priority = priority
+
+        self.pages = []
+        self.chunks_indexed = 0
+        self.error = None
+        self._stopped = threading.Event()
+        self._pages_queue = queue.Queue(maxsize=queue_size)
+        self._chunks_queue = queue.Queue(maxsize=queue_size)
+        self._embedded_queue = queue.Queue(maxsize=queue_size)
+
+    # --- Queue helpers ---
+    def _put(self, q, item):
+        """Blocks while q is full, but gives up once the pipeline has been stopped."""
+        while not self._stopped.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+        raise PipelineStopped()
+
+    def _iter_queue(self, q):
+        while True:
+            try:
+                item = q.get(timeout=0.1)
+            except queue.Empty:
+                if self._stopped.is_set():
+                    raise PipelineStopped()
+                continue
+            if item is _DONE:
+                return
+            yield item
+
+    def _count(self, name, amount):
+        if self.job:
+            self.job.add_count(name, amount)
+
+    def _run_stage(self, name, stage, target):
+        if self.job:
+            self.job.start_stage(stage)
+        try:
+            target()
+        except PipelineStopped:
+            if self.job:
+                self.job.fail_stage(stage, f"Stopped: {self.error}")
+            return
+        except Exception as e:
+            if self.error is None:
+                self.error = Exception(f"{name} failed: {e}")
+            self._stopped.set()
+            if self.job:
+                self.job.fail_stage(stage, e)
+            return
+        if self.job:
+            self.job.finish_stage(stage)
+
+    # --- Stages ---
+    def _ocr_stage(self):
+        for page_number, markdown in enumerate(iter_pages_with_ocr(self.pdf_path)):
+            self.pages.append(markdown)
+            if self.on_page:
+                self.on_page(page_number, markdown)
+            self._count('pages_ocrd', 1)
+            self._put(self._pages_queue, markdown)
+        self._put(self._pages_queue, _DONE)
+
+    def _chunk_stage(self):
+        batch = []
+
+        def pages():
+            for page in self._iter_queue(self._pages_queue):
+                yield page
+                # The chunks completed by this page are batched. If the next page is not ready yet
+                # (e.g. OCR of the next page group is still running), pass the partial batch on now
+                # instead of holding it until embed_batch_size chunks have arrived.
+                if batch and self._pages_queue.empty():
+                    self._put(self._chunks_queue, batch[:])
+                    del batch[:]
+
+        # batch_size=1: segment each page as soon as it arrives instead of waiting for a spaCy batch.
+        for chunk in iter_sentence_chunks(pages(), max_words=self.max_words, batch_size=1):
+            batch.append(chunk)
+            self._count('chunks_created', 1)
+            if len(batch) >= self.embed_batch_size:
+                self._put(self._chunks_queue, batch[:])
+                del batch[:]
+        if batch:
+            self._put(self._chunks_queue, batch)
+        self._put(self._chunks_queue, _DONE)
+
+    def _embed_stage(self):
+        for batch in self._iter_queue(self._chunks_queue):
+            if self.embed_pool is not None:
+                embeddings = self.embed_pool.run(embed_chunks_batched, batch, batch_size=self.embed_batch_size,
+                                                 priority=self.priority)
+            else:
+                embeddings = embed_chunks_batched(batch, batch_size=self.embed_batch_size)
+            self._count('chunks_embedded', len(batch))
+            self._put(self._embedded_queue, (batch, embeddings))
+        self._put(self._embedded_queue, _DONE)
+
+    def _index_stage(self):
+        for batch, embeddings in self._iter_queue(self._embedded_queue):
+            added = add_embeddings_to_global_faiss(batch, embeddings, self.document_id, self.original_filename)
+            self.chunks_indexed += added
+            self._count('chunks_indexed', added)
+
+    def cancel(self):
+        """Stops all stages; run() then raises PipelineCancelled."""
+        if self.error is None:
+            self.error = PipelineCancelled(f"Processing of document {self.document_id} was cancelled.")
+        self._stopped.set()
+
+    def run(self):
+        """
+        Runs all stages to completion and returns the full extracted text.
+        Raises the first stage error, if any.
+        """
+        threads = [
+            threading.Thread(target=self._run_stage, args=(name, stage, target), name=f"ingest-{stage}-{self.document_id}", daemon=True)
+            for name, stage, target in (
+                ("OCR", 'ocr', self._ocr_stage),
+                ("chunking", 'chunking', self._chunk_stage),
+                ("embedding", 'embedding', self._embed_stage),
+            )
+        ]
+        for thread in threads:
+            thread.start()
+        # The index stage runs on the calling thread.
+        self._run_stage("indexing", 'indexing', self._index_stage)
+        for thread in threads:
+            thread.join()
+
+        if self.error is not None:
+            raise self.error
+        print(f"Document {self.document_id}: {len(self.pages)} pages, {self.chunks_indexed} chunks indexed.")
+        return "\n\n".join(self.pages)
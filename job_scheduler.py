@@ -0,0 +1,207 @@
+# job_scheduler.py
+import heapq
+import itertools
+import threading
+
+_current = threading.local()
+
+
+class QueueFullError(Exception):
+    """Raised when a pool's queue is full and the caller did not ask to wait."""
+
+
+class JobCancelled(Exception):
+    """Raised by ScheduledJob.result() for a job that was cancelled before it finished."""
+
+
+def current_job():
+    """Returns the ScheduledJob running on the calling worker thread, or None."""
+    return getattr(_current, 'job', None)
+
+
+class ScheduledJob:
+    """Handle of a submitted job: wait for its result or cancel it."""
+
+    def __init__(self, fn, args, kwargs, job_id, priority):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.job_id = job_id
+        self.priority = priority
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._cancel_callbacks = []
+        self._result = None
+        self._exception = None
+        self.cancelled = False
+        self.started = False
+
+    def on_cancel(self, callback):
+        """Registers a callback that stops the running work when the job is cancelled."""
+        with self._lock:
+            if not self.cancelled:
+                self._cancel_callbacks.append(callback)
+                return
+        callback()
+
+    def cancel(self):
+        """Cancels the job. A queued job never runs; a running job gets its cancel callbacks invoked."""
+        with self._lock:
+            if self._done.is_set() or self.cancelled:
+                return False
+            self.cancelled = True
+            callbacks = list(self._cancel_callbacks)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Error cancelling job {self.job_id}: {e}")
+        if not self.started:
+            self._exception = JobCancelled(f"Job {self.job_id} was cancelled.")
+            self._done.set()
+        return True
+
+    def _run(self):
+        with self._lock:
+            if self.cancelled:
+                return
+            self.started = True
+        _current.job = self
+        try:
+            self._result = self.fn(*self.args, **self.kwargs)
+        except BaseException as e:
+            self._exception = e
+        finally:
+            _current.job = None
+            self._done.set()
+
+    def done(self):
+        return self._done.is_set()
+
+    def result(self, timeout=None):
+        if not self._done.wait(timeout):
+            raise TimeoutError(f"Job {self.job_id} did not finish within {timeout}s.")
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+
+class WorkerPool:
+    """
+    Fixed number of worker threads consuming a bounded priority queue.
+    Lower priority values run first; equal priorities run in submission order.
+    """
+
+    def __init__(self, name, workers, max_queue):
+        self.name = name
+        self.workers = workers
+        self.max_queue = max_queue
+        self._cond = threading.Condition()
+        self._heap = []
+        self._sequence = itertools.count()
+        self._active = 0
+        self._threads = []
+
+    def _ensure_started(self):
+        """Starts the worker threads on first submit. Must be called with _cond held."""
+        if self._threads:
+            return
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"{self.name}-worker-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, fn, *args, job_id=None, priority=0, block=False, **kwargs):
+        """
+        Queues fn(*args, **kwargs) and returns its ScheduledJob.
+        Raises QueueFullError if the queue is full, unless block is True.
+        """
+        job = ScheduledJob(fn, args, kwargs, job_id, priority)
+        with self._cond:
+            self._ensure_started()
+            while len(self._heap) >= self.max_queue:
+                if not block:
+                    raise QueueFullError(f"The {self.name} queue is full ({self.max_queue} jobs waiting).")
+                self._cond.wait()
+            heapq.heappush(self._heap, (priority, next(self._sequence), job))
+            self._cond.notify_all()
+        return job
+
+    def run(self, fn, *args, priority=0, **kwargs):
+        """Runs fn on the pool, waiting for queue space and for the result. Used for work shared between jobs."""
+        return self.submit(fn, *args, priority=priority, block=True, **kwargs).result()
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                _, _, job = heapq.heappop(self._heap)
+                self._active += 1
+                # Wake up submitters waiting for queue space.
+                self._cond.notify_all()
+            try:
+                job._run()
+            finally:
+                with self._cond:
+                    self._active -= 1
+
+    def cancel(self, job_id):
+        """Removes the queued jobs with the given job_id from the queue and cancels them."""
+        with self._cond:
+            jobs = [job for _, _, job in self._heap if job.job_id == job_id]
+            self._heap = [entry for entry in self._heap if entry[2].job_id != job_id]
+            heapq.heapify(self._heap)
+            self._cond.notify_all()
+        for job in jobs:
+            job.cancel()
+        return len(jobs)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'workers': self.workers,
+                'active': self._active,
+                'queued': len(self._heap),
+                'max_queue': self.max_queue,
+            }
+
+
+class JobScheduler:
+    """Named worker pools, one per kind of work, plus cancellation of running jobs by id."""
+
+    def __init__(self, pools):
+        """pools: {name: (workers, max_queue)}"""
+        self.pools = {name: WorkerPool(name, workers, max_queue) for name, (workers, max_queue) in pools.items()}
+        self._running = {}
+        self._lock = threading.Lock()
+
+    def pool(self, name):
+        return self.pools[name]
+
+    def submit(self, pool_name, fn, *args, job_id=None, priority=0, block=False, **kwargs):
+        job = self.pools[pool_name].submit(fn, *args, job_id=job_id, priority=priority, block=block, **kwargs)
+        if job_id is not None:
+            with self._lock:
+                self._running.setdefault(job_id, []).append(job)
+        return job
+
+    def cancel(self, job_id):
+        """Cancels all queued and running jobs submitted with job_id. Returns True if any job was cancelled."""
+        with self._lock:
+            jobs = self._running.pop(job_id, [])
+        cancelled = [job.cancel() for job in jobs]
+        # Also frees the queue slots of jobs that had not started yet.
+        for pool in self.pools.values():
+            pool.cancel(job_id)
+        return any(cancelled)
+
+    def forget(self, job_id):
+        """Drops the bookkeeping of a finished job."""
+        with self._lock:
+            self._running.pop(job_id, None)
+
+    def stats(self):
+        return {name: pool.stats() for name, pool in self.pools.items()}
@@ -0,0 +1,153 @@
+# job_status.py
+import threading
+import time
+
+STAGES = ('ocr', 'chunking', 'embedding', 'indexing', 'summary')
+
+PENDING = 'pending'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+# Indexed and queryable, but the summary could not be generated.
+DEGRADED = 'degraded'
+
+
+class DocumentJob:
+    """
+    Per-stage state, timings and counters of the background processing of one document.
+    Every change bumps a version number so that listeners can wait for the next update.
+    """
+
+    def __init__(self, document_id, filename=None):
+        self.document_id = document_id
+        self.filename = filename
+        self.created_at = time.time()
+        # Set once every stage has completed or one has failed (see finished).
+        self.finished_at = None
+        self.version = 0
+        self._cond = threading.Condition()
+        self._stages = {
+            name: {'state': PENDING, 'started_at': None, 'finished_at': None, 'duration': None, 'error': None}
+            for name in STAGES
+        }
+        self._counters = {}
+
+    def _changed(self):
+        self.version += 1
+        if self.finished_at is None and self.finished:
+            self.finished_at = time.time()
+        self._cond.notify_all()
+
+    def start_stage(self, name):
+        with self._cond:
+            stage = self._stages[name]
+            if stage['state'] == PENDING:
+                stage['state'] = RUNNING
+                stage['started_at'] = time.time()
+                self._changed()
+
+    def finish_stage(self, name):
+        with self._cond:
+            stage = self._stages[name]
+            if stage['started_at'] is None:
+                stage['started_at'] = time.time()
+            stage['state'] = COMPLETED
+            stage['finished_at'] = time.time()
+            stage['duration'] = round(stage['finished_at'] - stage['started_at'], 3)
+            self._changed()
+
+    def fail_stage(self, name, error):
+        with self._cond:
+            stage = self._stages[name]
+            stage['state'] = FAILED
+            stage['error'] = str(error)
+            stage['finished_at'] = time.time()
+            if stage['started_at'] is not None:
+                stage['duration'] = round(stage['finished_at'] - stage['started_at'], 3)
+            self._changed()
+
+    def fail_pending(self, reason):
+        """Marks every stage that has not completed yet as failed, e.g. when the job is cancelled."""
+        with self._cond:
+            for stage in self._stages.values():
+                if stage['state'] in (PENDING, RUNNING):
+                    stage['state'] = FAILED
+                    stage['error'] = reason
+                    stage['finished_at'] = time.time()
+            self._changed()
+
+    def add_count(self, name, amount=1):
+        """Increments a progress counter such as pages_ocrd or chunks_indexed."""
+        with self._cond:
+            self._counters[name] = self._counters.get(name, 0) + amount
+            self._changed()
+
+    @property
+    def state(self):
+        states = [stage['state'] for stage in self._stages.values()]
+        if FAILED in states:
+            indexed = all(stage['state'] == COMPLETED for name, stage in self._stages.items() if name != 'summary')
+            return DEGRADED if indexed else FAILED
+        if all(state == COMPLETED for state in states):
+            return COMPLETED
+        if all(state == PENDING for state in states):
+            return PENDING
+        return RUNNING
+
+    @property
+    def finished(self):
+        return self.state in (COMPLETED, DEGRADED, FAILED)
+
+    def snapshot(self):
+        with self._cond:
+            return {
+                'document_id': self.document_id,
+                'filename': self.filename,
+                'state': self.state,
+                'version': self.version,
+                'elapsed': round(time.time() - self.created_at, 3),
+                'stages': {name: dict(stage) for name, stage in self._stages.items()},
+                'progress': dict(self._counters),
+            }
+
+    def wait_for_change(self, version, timeout=None):
+        """Blocks until the job's version differs from version (or timeout) and returns the current version."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.version != version, timeout=timeout)
+            return self.version
+
+
+class JobTracker:
+    """
+    In-memory registry of document processing jobs. Finished jobs are dropped ttl_seconds
+    after they finish; the status of their documents is then derived from the document registry.
+    """
+
+    def __init__(self, ttl_seconds=3600):
+        self.ttl_seconds = ttl_seconds
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _expired(self, job, now):
+        return job.finished_at is not None and now - job.finished_at > self.ttl_seconds
+
+    def _prune(self):
+        """Drops expired jobs. Must be called with _lock held."""
+        now = time.time()
+        for document_id in [document_id for document_id, job in self._jobs.items() if self._expired(job, now)]:
+            del self._jobs[document_id]
+
+    def create(self, document_id, filename=None):
+        job = DocumentJob(document_id, filename)
+        with self._lock:
+            self._prune()
+            self._jobs[document_id] = job
+        return job
+
+    def get(self, document_id):
+        with self._lock:
+            job = self._jobs.get(document_id)
+            if job is not None and self._expired(job, time.time()):
+                del self._jobs[document_id]
+                return None
+            return job
@@ -0,0 +1,231 @@
+# llm_client.py
+"""
+Shared access to the hosted LLMs (Gemini and Groq).
+
+Clients and model objects are created once per process. Every call waits for a token
+from a per-provider token bucket sized to our quota, has a timeout, and is retried
+with exponential backoff on rate limiting, timeouts and server errors. Concurrent
+identical non-streaming requests are coalesced into a single upstream call.
+"""
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+
+import google.generativeai as genai
+from dotenv import load_dotenv
+
+load_dotenv()
+
+genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL_NAME", "models/gemini-1.5-flash-latest")
+GROQ_MODEL_NAME = os.getenv("GROQ_MODEL_NAME", "mixtral-8x7b-32768")
+
+GEMINI_REQUESTS_PER_MINUTE = float(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "60"))
+GROQ_REQUESTS_PER_MINUTE = float(os.getenv("GROQ_REQUESTS_PER_MINUTE", "30"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+
+# Error types that are worth retrying even when they carry no HTTP status code.
+_RETRYABLE_ERROR_NAMES = {
+    'DeadlineExceeded', 'ServiceUnavailable', 'ResourceExhausted', 'TooManyRequests', 'InternalServerError',
+    'APIConnectionError', 'APITimeoutError', 'RateLimitError',
+}
+
+
+class TokenBucket:
+    """Allows `rate` calls per second on average, with bursts of up to `capacity` calls."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a call is allowed."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def _bucket_per_minute(requests_per_minute):
+    # Bursts of up to a tenth of the minute's quota.
+    return TokenBucket(requests_per_minute / 60.0, max(1.0, requests_per_minute / 10.0))
+
+
+_gemini_bucket = _bucket_per_minute(GEMINI_REQUESTS_PER_MINUTE)
+_groq_bucket = _bucket_per_minute(GROQ_REQUESTS_PER_MINUTE)
+
+
+def _is_retryable(error):
+    code = getattr(error, 'code', None)
+    if not isinstance(code, int):
+        code = getattr(error, 'status_code', None)
+    if isinstance(code, int) and (code == 429 or code >= 500):
+        return True
+    return isinstance(error, (TimeoutError, ConnectionError)) or type(error).__name__ in _RETRYABLE_ERROR_NAMES
+
+
+def _with_retries(call, bucket, description, max_retries=None):
+    """Runs call() under the rate limit, retrying retryable errors with exponential backoff and jitter."""
+    max_retries = LLM_MAX_RETRIES if max_retries is None else max_retries
+    for attempt in range(max_retries + 1):
+        bucket.acquire()
+        try:
+            return call()
+        except Exception as e:
+            if attempt >= max_retries or not _is_retryable(e):
+                raise
+            delay = min(2 ** attempt, 30) * (0.5 + random.random())
+            print(f"{description} failed ({type(e).__name__}: {e}); retrying in {delay:.1f}s "
+                  f"(attempt {attempt + 1}/{max_retries})...")
+            time.sleep(delay)
+
+
+# --- Single-flight ---
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def _single_flight(key, call):
+    """Runs call() once for concurrent callers with the same key; the others wait for and share its result."""
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+    if not leader:
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+    try:
+        flight.result = call()
+        return flight.result
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        with _flights_lock:
+            del _flights[key]
+        flight.done.set()
+
+
+def _request_key(*parts):
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+# --- Gemini ---
+_models = {}
+_models_lock = threading.Lock()
+
+
+def get_model(model_name=None):
+    """Returns the process-wide GenerativeModel for model_name."""
+    model_name = model_name or GEMINI_MODEL_NAME
+    with _models_lock:
+        model = _models.get(model_name)
+        if model is None:
+            model = _models[model_name] = genai.GenerativeModel(model_name)
+        return model
+
+
+def generate_content(prompt, model_name=None, generation_config=None, timeout=None):
+    """
+    Calls Gemini generate_content with rate limiting, a timeout and retries, and returns the response.
+    generation_config is a dict of GenerationConfig fields. Identical concurrent calls share one request.
+    """
+    model_name = model_name or GEMINI_MODEL_NAME
+    generation_config = generation_config or {}
+    timeout = timeout or LLM_TIMEOUT_SECONDS
+    model = get_model(model_name)
+
+    def call():
+        return model.generate_content(
+            prompt,
+            generation_config=genai.types.GenerationConfig(**generation_config),
+            request_options={'timeout': timeout}
+        )
+
+    key = _request_key('gemini', model_name, prompt, generation_config)
+    return _single_flight(key, lambda: _with_retries(call, _gemini_bucket, f"Gemini request to {model_name}"))
+
+
+def stream_content(prompt, model_name=None, generation_config=None, timeout=None):
+    """
+    Streaming generate_content: yields the text of each response chunk. The initial
+    request is rate limited and retried; a stream that fails midway is not restarted.
+    """
+    model_name = model_name or GEMINI_MODEL_NAME
+    generation_config = generation_config or {}
+    timeout = timeout or LLM_TIMEOUT_SECONDS
+    model = get_model(model_name)
+
+    response = _with_retries(
+        lambda: model.generate_content(
+            prompt,
+            generation_config=genai.types.GenerationConfig(**generation_config),
+            request_options={'timeout': timeout},
+            stream=True
+        ),
+        _gemini_bucket,
+        f"Gemini streaming request to {model_name}"
+    )
+    for chunk in response:
+        try:
+            text = chunk.text
+        except ValueError:
+            # A chunk without text parts, e.g. the final one carrying only the finish reason.
+            continue
+        if text:
+            yield text
+
+
+# --- Groq ---
+_groq_client = None
+_groq_lock = threading.Lock()
+
+
+def get_groq_client():
+    """Returns the process-wide Groq client; retries are done here rather than by the SDK."""
+    global _groq_client
+    with _groq_lock:
+        if _groq_client is None:
+            from groq import Groq
+            _groq_client = Groq(api_key=os.getenv("GROQ_API_KEY"), timeout=LLM_TIMEOUT_SECONDS, max_retries=0)
+        return _groq_client
+
+
+def groq_chat(prompt, model_name=None, temperature=0.7):
+    """Single-message Groq chat completion with rate limiting, retries and coalescing. Returns the reply text."""
+    model_name = model_name or GROQ_MODEL_NAME
+    client = get_groq_client()
+
+    def call():
+        response = client.chat.completions.create(
+            model=model_name,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=temperature
+        )
+        return response.choices[0].message.content.strip()
+
+    key = _request_key('groq', model_name, prompt, temperature)
+    return _single_flight(key, lambda: _with_retries(call, _groq_bucket, f"Groq request to {model_name}"))
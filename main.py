@@ -1,24 +1,37 @@
 # main.py 
 import os
+import json
 import uuid
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context
 from werkzeug.utils import secure_filename
-from threading import Thread 
 import time 
 
-from flashcard_generator import generate_flashcards
-from qna_generator import generate_questions_answers, answer_question_from_context 
+from flashcard_generator import generate_flashcards, FLASHCARD_MODEL_NAME
+from qna_generator import generate_questions_answers, answer_question_from_context, stream_answer_from_context, QNA_MODEL_NAME
 from summary_generator import generate_summary 
-from mindmap_generator import generate_mind_map_data
+from mindmap_generator import generate_mind_map_json, render_mind_map, error_image, MINDMAP_MODEL_NAME
+from document_registry import DocumentRegistry, fingerprint_file
 
 
 from mistral_response import (
-    extract_text_with_ocr, 
-    sentence_based_chunking, 
-    add_chunks_to_global_faiss, 
-    search_global_faiss_index, 
-    load_global_faiss_index 
+    retrieve_chunks, 
+    load_global_faiss_index,
+    global_index_manager,
+    bm25_index
 )
+from answer_cache import AnswerCache
+from artifact_cache import ArtifactCache
+from context_builder import build_context, truncate_to_budget
+from ingestion_pipeline import IngestionPipeline
+from job_status import JobTracker
+from job_scheduler import JobScheduler, QueueFullError, current_job
+import model_registry
+
+# With PRELOAD_MODELS=1 the models are loaded at import rather than on the first request.
+# The app must be served from a single process (e.g. gunicorn -w 1 --threads N): the index
+# has a single writer and job, document and cache state live in process memory.
+if os.getenv("PRELOAD_MODELS") == "1":
+    model_registry.warm_up()
 
 app = Flask(__name__) 
 app.config['UPLOAD_FOLDER'] = 'uploads'
@@ -26,6 +39,36 @@ app.config['ALLOWED_EXTENSIONS'] = {'pdf'}
 
 
 document_data = {} 
+# Persistent record of processed documents, used to skip re-processing identical uploads.
+document_registry = DocumentRegistry('documents')
+# Per-stage progress of background processing, exposed via /status/<document_id>.
+job_tracker = JobTracker(ttl_seconds=int(os.getenv("JOB_STATUS_TTL_SECONDS", "3600")))
+# Answers to repeated (or near-identical) questions per document, served without an LLM call.
+answer_cache = AnswerCache(
+    max_entries_per_doc=int(os.getenv("ANSWER_CACHE_MAX_ENTRIES_PER_DOC", "256")),
+    ttl_seconds=int(os.getenv("ANSWER_CACHE_TTL_SECONDS", str(24 * 3600))),
+    similarity_threshold=float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95")),
+)
+# Generated flashcards, Q&A pairs and mind maps, keyed by the summary, model and parameters they came from.
+artifact_cache = ArtifactCache(os.path.join('cache', 'artifacts'))
+FLASHCARD_PARAMS = {'max_output_tokens': 1500}
+QNA_PARAMS = {'num_qa_pairs': 3, 'max_new_tokens': 1000}
+MINDMAP_PARAMS = {'max_new_tokens': 1500}
+
+# Question answering context: at most CONTEXT_BUDGET_TOKENS tokens, assembled from the
+# CONTEXT_CANDIDATES best retrieved chunks and CONTEXT_NEIGHBOURS adjacent chunks on each side.
+CONTEXT_BUDGET_TOKENS = int(os.getenv("CONTEXT_BUDGET_TOKENS", "3000"))
+CONTEXT_CANDIDATES = int(os.getenv("CONTEXT_CANDIDATES", "10"))
+CONTEXT_NEIGHBOURS = int(os.getenv("CONTEXT_NEIGHBOURS", "1"))
+CONTEXT_MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7"))
+
+# Fixed-size worker pools with bounded queues. Ingestion (driven by OCR) and summarization are
+# network-bound; embedding is CPU-bound and shares a single model, so it gets its own small pool.
+scheduler = JobScheduler({
+    'ingest': (int(os.getenv("INGEST_WORKERS", "4")), int(os.getenv("INGEST_QUEUE_SIZE", "32"))),
+    'embedding': (int(os.getenv("EMBEDDING_WORKERS", "1")), int(os.getenv("EMBEDDING_QUEUE_SIZE", "64"))),
+    'summary': (int(os.getenv("SUMMARY_WORKERS", "2")), int(os.getenv("SUMMARY_QUEUE_SIZE", "64"))),
+})
 
 
 def allowed_file(filename):
@@ -33,9 +76,22 @@ def allowed_file(filename):
            filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
 
 
-@app.before_request
+def get_document_data(document_id):
+    """Returns the in-memory data of a document, restoring it from the document registry after a restart."""
+    data = document_data.get(document_id)
+    if data is None:
+        record = document_registry.get(document_id)
+        full_text = document_registry.load_text(document_id) if record else None
+        if full_text is None:
+            return None
+        data = {'full_text': full_text, 'summary': record.get('summary')}
+        document_data[document_id] = data
+    return data
+
+
 def load_faiss_on_startup():
-    print("Ensuring FAISS index is loaded on app startup via mistral_response.")
+    # The index stays resident after this, so requests never re-read it from disk.
+    print("Loading FAISS index into memory on app startup via mistral_response.")
     load_global_faiss_index() 
 
 @app.route('/')
@@ -58,61 +114,184 @@ def upload_file():
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], f"{document_id}_{filename}")
         file.save(filepath)
 
-        
-        try:
-            full_text = extract_text_with_ocr(filepath)
-            if full_text.startswith("Error"): 
-                raise Exception(full_text)
-            
-            
-            document_data[document_id] = {
-                'full_text': full_text,
-                'summary': None 
-            }
+        # Identical files map to the document that was created for them the first time.
+        fingerprint = fingerprint_file(filepath)
+        existing_id = document_registry.claim(fingerprint, document_id, filename)
+        if existing_id != document_id:
+            os.remove(filepath)
+            print(f"Upload of {filename} is a duplicate of document {existing_id}. Skipping processing.")
+            return jsonify({"message": "This file was already uploaded. Reusing the existing document.", "document_id": existing_id, "duplicate": True,
+                            "status_url": f"/status/{existing_id}"})
 
-            
-            def process_and_index_document_async(doc_id, text_content, original_filename):
-                print(f"Starting chunking and indexing for document {doc_id} in background...")
-                try:
-                    chunks = sentence_based_chunking(text_content)
-                    if chunks:
-                        add_chunks_to_global_faiss(chunks, doc_id, original_filename)
-                        print(f"Document {doc_id} chunks indexed successfully.")
-                    else:
-                        print(f"No chunks generated for document {doc_id}.")
-                except Exception as e:
-                    print(f"Error during background indexing for document {doc_id}: {e}")
+        if not os.getenv("MISTRAL_API_KEY"):
+            document_registry.remove(document_id)
+            return jsonify({"error": "Error processing document: MISTRAL_API_KEY is not set in the environment variables."}), 500
 
-            
-            def generate_summary_async(doc_id, text_content):
-                print(f"Starting summary generation for document {doc_id} in background...")
-                try:
-                    summary_text = generate_summary(text_content)
-                    if summary_text and not summary_text.startswith("Could not generate"): 
-                        document_data[doc_id]['summary'] = summary_text
-                        print(f"Summary generated for document {doc_id}.")
-                    else:
-                        print(f"Failed to generate summary for document {doc_id}: {summary_text}")
-                except Exception as e:
-                    print(f"Error generating summary for document {doc_id}: {e}")
-
-            
-            thread_indexing = Thread(target=process_and_index_document_async, args=(document_id, full_text, filename))
-            thread_indexing.start()
-            
-            thread_summary = Thread(target=generate_summary_async, args=(document_id, full_text))
-            thread_summary.start() 
+        try:
+            # Lower values are processed first.
+            priority = int(request.form.get('priority', 0))
+        except ValueError:
+            priority = 0
+
+        # The document is queryable as soon as its first pages are indexed; the full text follows when OCR completes.
+        document_data[document_id] = {
+            'full_text': None,
+            'summary': None 
+        }
+        job = job_tracker.create(document_id, filename)
+
+        def process_document_async(doc_id, pdf_path, original_filename):
+            print(f"Starting streaming OCR, chunking and indexing for document {doc_id} in background...")
+            pipeline = IngestionPipeline(doc_id, pdf_path, original_filename, job=job,
+                                         embed_pool=scheduler.pool('embedding'), priority=priority)
+            current_job().on_cancel(pipeline.cancel)
+            try:
+                full_text = pipeline.run()
+            except Exception as e:
+                job.fail_stage('summary', "Not started because processing failed.")
+                print(f"Error processing document {doc_id}: {e}")
+                document_registry.remove(doc_id)
+                document_data.pop(doc_id, None)
+                answer_cache.invalidate(doc_id)
+                artifact_cache.invalidate(doc_id)
+                bm25_index.remove(doc_id)
+                scheduler.forget(doc_id)
+                return
+
+            if current_job().cancelled:
+                return
+            try:
+                document_data[doc_id]['full_text'] = full_text
+                document_registry.save_text(doc_id, full_text)
+                # The document's indexed content is final now; answers and artifacts are only cached from here on.
+                answer_cache.invalidate(doc_id)
+                artifact_cache.invalidate(doc_id)
+                print(f"Document {doc_id} OCR'd and indexed successfully.")
+                # Waits for a free slot rather than dropping the summary of an already indexed document.
+                scheduler.submit('summary', generate_summary_async, doc_id, full_text,
+                                 job_id=doc_id, priority=priority, block=True)
+            except Exception as e:
+                # The document stays indexed and queryable; only its summary is missing.
+                job.fail_pending(f"Not started because finishing the document failed: {e}")
+                print(f"Error finishing document {doc_id}: {e}")
+                scheduler.forget(doc_id)
+
+        def generate_summary_async(doc_id, text_content):
+            print(f"Starting summary generation for document {doc_id} in background...")
+            job.start_stage('summary')
+            try:
+                summary_text = generate_summary(text_content)
+                if current_job().cancelled:
+                    # The job was cancelled while running and its stage already reported as failed.
+                    print(f"Summary generation for document {doc_id} was cancelled. Discarding the result.")
+                    return
+                if summary_text and not summary_text.startswith("Could not generate"): 
+                    document_data[doc_id]['summary'] = summary_text
+                    document_registry.update(doc_id, summary=summary_text)
+                    artifact_cache.invalidate(doc_id)
+                    job.finish_stage('summary')
+                    print(f"Summary generated for document {doc_id}.")
+                else:
+                    job.fail_stage('summary', summary_text)
+                    print(f"Failed to generate summary for document {doc_id}: {summary_text}")
+            except Exception as e:
+                job.fail_stage('summary', e)
+                print(f"Error generating summary for document {doc_id}: {e}")
+            finally:
+                scheduler.forget(doc_id)
 
-            return jsonify({"message": "File uploaded and processing (OCR, chunking, indexing, summary) started in background!", "document_id": document_id})
-        except Exception as e:
-            print(f"Error processing document {filename}: {e}")
-            return jsonify({"error": f"Error processing document: {e}"}), 500
+        try:
+            scheduler.submit('ingest', process_document_async, document_id, filepath, filename,
+                             job_id=document_id, priority=priority)
+        except QueueFullError as e:
+            print(f"Rejecting upload of {filename}: {e}")
+            job.fail_pending(str(e))
+            document_registry.remove(document_id)
+            document_data.pop(document_id, None)
+            os.remove(filepath)
+            response = jsonify({"error": "Server is busy processing other documents. Please try again shortly.",
+                                "queue": scheduler.stats()['ingest']})
+            response.headers['Retry-After'] = '30'
+            return response, 429
+
+        return jsonify({
+            "message": "File uploaded and processing (OCR, chunking, indexing, summary) started in background!",
+            "document_id": document_id,
+            "job_id": document_id,
+            "status_url": f"/status/{document_id}"
+        })
     return jsonify({"error": "File type not allowed"}), 400
 
 
+def get_status_snapshot(document_id):
+    """Returns the processing status of a document, or None if the document is unknown."""
+    job = job_tracker.get(document_id)
+    if job is not None:
+        return job.snapshot()
+    # Documents processed before a restart (or reused by a duplicate upload) have no live job.
+    data = get_document_data(document_id)
+    if data is None:
+        return None
+    return {
+        'document_id': document_id,
+        'state': 'completed' if data['full_text'] is not None else 'running',
+        'stages': {},
+        'progress': {},
+        'summary_ready': data['summary'] is not None,
+    }
+
+
+@app.route('/status/<document_id>', methods=['GET'])
+def get_status(document_id):
+    status = get_status_snapshot(document_id)
+    if status is None:
+        return jsonify({"error": "Document not found."}), 404
+    return jsonify(status)
+
+
+@app.route('/status/<document_id>/events', methods=['GET'])
+def stream_status(document_id):
+    """Server-sent events: one status message per change until processing completes or fails."""
+    if get_status_snapshot(document_id) is None:
+        return jsonify({"error": "Document not found."}), 404
+
+    def events():
+        job = job_tracker.get(document_id)
+        while True:
+            status = job.snapshot() if job else get_status_snapshot(document_id)
+            yield f"data: {json.dumps(status)}\n\n"
+            if job is None or job.finished:
+                return
+            # Re-sends the status at least every 15 seconds, which also keeps the connection alive.
+            job.wait_for_change(status['version'], timeout=15)
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/cancel/<document_id>', methods=['POST'])
+def cancel_processing(document_id):
+    job = job_tracker.get(document_id)
+    if job is None:
+        return jsonify({"error": "No processing job found for this document."}), 404
+    if not scheduler.cancel(document_id):
+        return jsonify({"error": "Processing has already finished."}), 409
+
+    job.fail_pending("Cancelled.")
+    data = document_data.get(document_id)
+    if data is None or data['full_text'] is None:
+        # Cancelled before the document was fully indexed: forget it so a re-upload starts over.
+        document_registry.remove(document_id)
+        document_data.pop(document_id, None)
+        answer_cache.invalidate(document_id)
+        artifact_cache.invalidate(document_id)
+        bm25_index.remove(document_id)
+    return jsonify({"message": "Processing cancelled.", "document_id": document_id})
+
+
 @app.route('/generate_summary/<document_id>', methods=['GET'])
 def get_summary(document_id):
-    if document_id not in document_data:
+    if get_document_data(document_id) is None:
         return jsonify({"error": "Document not found or not processed."}), 404
     
     
@@ -122,12 +301,16 @@ def get_summary(document_id):
         return jsonify({"summary": summary})
     else:
         
-        print(f"Summary not found for {document_id}, attempting synchronous generation...")
         text_content = document_data[document_id]['full_text']
+        if text_content is None:
+            return jsonify({"error": "Document is still being processed. Please wait for OCR to complete."}), 404
+        print(f"Summary not found for {document_id}, attempting synchronous generation...")
         try:
             summary = generate_summary(text_content)
             if summary and not summary.startswith("Could not generate"):
                 document_data[document_id]['summary'] = summary 
+                document_registry.update(document_id, summary=summary)
+                artifact_cache.invalidate(document_id)
                 return jsonify({"summary": summary})
             else:
                 return jsonify({"error": f"Failed to generate summary: {summary}"}), 500
@@ -136,16 +319,30 @@ def get_summary(document_id):
             return jsonify({"error": f"Error generating summary: {e}"}), 500
 
 
+def get_artifact(document_id, artifact, model_name, params, generate):
+    """
+    Returns the artifact generated from the document's summary by generate(summary), served from
+    the artifact cache unless the request asks for ?regenerate=1. Empty results are not cached.
+    """
+    summary = document_data[document_id]['summary']
+    if request.args.get('regenerate') != '1':
+        value = artifact_cache.get(document_id, artifact, summary, model_name, params)
+        if value is not None:
+            return value
+    value = generate(summary)
+    if value:
+        artifact_cache.put(document_id, artifact, summary, model_name, params, value)
+    return value
+
+
 @app.route('/generate_flashcards/<document_id>', methods=['GET'])
 def get_flashcards(document_id):
-    if document_id not in document_data or document_data[document_id]['summary'] is None:
+    if get_document_data(document_id) is None or document_data[document_id]['summary'] is None:
         return jsonify({"error": "Document summary not found or not processed. Please wait for processing to complete or generate summary first."}), 404
     
-    
-    text_content = document_data[document_id]['summary']
-    
     try:
-        flashcards = generate_flashcards(text_content)
+        flashcards = get_artifact(document_id, 'flashcards', FLASHCARD_MODEL_NAME, FLASHCARD_PARAMS,
+                                  lambda summary: generate_flashcards(summary, **FLASHCARD_PARAMS))
         return jsonify({"flashcards": flashcards})
     except Exception as e:
         print(f"Error generating flashcards for {document_id}: {e}")
@@ -154,14 +351,12 @@ def get_flashcards(document_id):
 
 @app.route('/generate_qna/<document_id>', methods=['GET'])
 def get_qna(document_id):
-    if document_id not in document_data or document_data[document_id]['summary'] is None:
+    if get_document_data(document_id) is None or document_data[document_id]['summary'] is None:
         return jsonify({"error": "Document summary not found or not processed. Please wait for processing to complete or generate summary first."}), 404
     
-   
-    text_content = document_data[document_id]['summary'] 
-    
     try:
-        qa_pairs = generate_questions_answers(text_content)
+        qa_pairs = get_artifact(document_id, 'qna', QNA_MODEL_NAME, QNA_PARAMS,
+                                lambda summary: generate_questions_answers(summary, **QNA_PARAMS))
         return jsonify({"qa_pairs": qa_pairs})
     except Exception as e:
         print(f"Error generating general Q&A for {document_id}: {e}")
@@ -170,45 +365,106 @@ def get_qna(document_id):
 # Route for generating mind map
 @app.route('/generate_mindmap/<document_id>', methods=['GET'])
 def get_mindmap(document_id):
-    if document_id not in document_data: 
-        return jsonify({"error": "Document not found or not processed. Please wait for processing to complete."}), 404
-    
+    if get_document_data(document_id) is None or document_data[document_id]['summary'] is None:
+        return jsonify({"error": "Document summary not found or not processed. Please wait for processing to complete or generate summary first."}), 404
+
+    # An error image (e.g. for an unparseable model response) is returned but not cached.
+    error_images = []
+
+    def generate(summary):
+        mind_map_json, error = generate_mind_map_json(summary, **MINDMAP_PARAMS)
+        if mind_map_json is None:
+            error_images.append(error)
+            return None
+        try:
+            image = render_mind_map(mind_map_json)
+        except Exception as e:
+            print(f"Error during Graphviz rendering of the mind map for {document_id}: {e}")
+            error_images.append(error_image("Generation Error"))
+            return None
+        return {'json': mind_map_json, 'image': image}
 
-    #text_content = document_data[document_id]['full_text'] 
-    text_content = document_data[document_id]['summary'] 
     try:
-        mind_map_data_uri = generate_mind_map_data(text_content)
-        return jsonify({"mind_map_data": mind_map_data_uri})
+        mind_map = get_artifact(document_id, 'mindmap', MINDMAP_MODEL_NAME, MINDMAP_PARAMS, generate)
+        if mind_map is None:
+            return jsonify({"mind_map_data": error_images[0]})
+        return jsonify({"mind_map_data": mind_map['image'], "mind_map_json": mind_map['json']})
     except Exception as e:
         print(f"Error generating mind map for {document_id}: {e}")
         return jsonify({"error": f"Error generating mind map: {e}"}), 500
 
 
 
+def prepare_query(document_id, user_query):
+    """
+    First half of answering a question, shared by /query_document and its streaming variant.
+    Returns (error response, None), or (None, prepared) where prepared holds either a cached
+    'answer' or the 'context' to answer from, plus the 'sources' the context was built from.
+    """
+    data = get_document_data(document_id)
+    if data is None:
+        return (jsonify({"error": "Document not found or not fully processed. Please wait for indexing to complete."}), 404), None
+    # Answers given while the document is still being indexed may miss later pages, so they are not cached.
+    cacheable = data['full_text'] is not None
+    prepared = {'answer': None, 'context': None, 'sources': [], 'query_embedding': None, 'cacheable': cacheable}
+
+    cached_answer = answer_cache.get(document_id, user_query) if cacheable else None
+    if cached_answer is not None:
+        print(f"Answered query '{user_query}' for document {document_id} from the answer cache.")
+        prepared['answer'] = cached_answer
+        return None, prepared
+
+    print(f"Searching FAISS for query: '{user_query}' for document {document_id}...")
+    hits, query_embedding = retrieve_chunks(user_query, k=CONTEXT_CANDIDATES, document_id=document_id) 
+    prepared['query_embedding'] = query_embedding
+
+    if cacheable and query_embedding is not None:
+        cached_answer = answer_cache.get(document_id, user_query, query_embedding)
+        if cached_answer is not None:
+            print(f"Answered query '{user_query}' for document {document_id} from a similar cached question.")
+            prepared['answer'] = cached_answer
+            return None, prepared
+
+    if not hits:
+        print(f"No relevant chunks found for query '{user_query}'. Answering from the beginning of the document.")
+        
+        if data['full_text'] is None:
+            return (jsonify({"error": "Document is still being processed and no indexed content matches your query yet. Please try again shortly."}), 404), None
+        prepared['context'] = truncate_to_budget(data['full_text'], CONTEXT_BUDGET_TOKENS)
+    else:
+        prepared['context'], context_ids = build_context(
+            global_index_manager, [idx for idx, _ in hits], query_embedding,
+            budget_tokens=CONTEXT_BUDGET_TOKENS, neighbours=CONTEXT_NEIGHBOURS, mmr_lambda=CONTEXT_MMR_LAMBDA
+        )
+        prepared['sources'] = [
+            {'chunk_id': idx, 'source_filename': record['source_filename'], 'text': record['chunk_text']}
+            for idx, record in zip(context_ids, global_index_manager.records(context_ids)) if record
+        ]
+        print(f"Retrieved {len(hits)} chunks, built context from {len(context_ids)}. Context length: {len(prepared['context'].split())} words.")
+    return None, prepared
+
+
+def cache_answer(document_id, user_query, prepared, answer):
+    if prepared['cacheable'] and prepared['query_embedding'] is not None \
+            and answer and not answer.startswith(("Error:", "An error occurred")):
+        answer_cache.put(document_id, user_query, prepared['query_embedding'], answer)
+
+
 @app.route('/query_document/<document_id>', methods=['POST'])
 def query_document(document_id):
     user_query = request.json.get('query')
     if not user_query:
         return jsonify({"error": "No query provided"}), 400
 
-    if document_id not in document_data:
-        return jsonify({"error": "Document not found or not fully processed. Please wait for indexing to complete."}), 404
-
     try:
-        print(f"Searching FAISS for query: '{user_query}' for document {document_id}...")
-        
-
-        retrieved_chunks_text = search_global_faiss_index(user_query, k=5) 
-
-        if not retrieved_chunks_text:
-            print(f"No relevant chunks found for query '{user_query}'. Attempting to answer from full text (if context window allows).")
-            
-            context_for_llm = document_data[document_id]['full_text'] 
-        else:
-            context_for_llm = "\n---\n".join(retrieved_chunks_text)
-            print(f"Retrieved {len(retrieved_chunks_text)} chunks. Context length: {len(context_for_llm.split())} words.")
+        error, prepared = prepare_query(document_id, user_query)
+        if error is not None:
+            return error
+        if prepared['answer'] is not None:
+            return jsonify({"answer": prepared['answer']})
             
-        answer = answer_question_from_context(user_query, context_for_llm)
+        answer = answer_question_from_context(user_query, prepared['context'])
+        cache_answer(document_id, user_query, prepared, answer)
         
         return jsonify({"answer": answer})
 
@@ -216,9 +472,58 @@ def query_document(document_id):
         print(f"Error querying document {document_id} with query '{user_query}': {e}")
         return jsonify({"error": f"Error processing query: {e}. Please check server logs for details."}), 500
 
+
+def _sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.route('/query_document/<document_id>/stream', methods=['POST'])
+def query_document_stream(document_id):
+    """
+    Server-sent events variant of /query_document: a 'sources' event with the chunks the
+    answer is based on, then 'token' events as the model generates the answer, and a final
+    'done' event with the whole answer (or an 'error' event).
+    """
+    user_query = request.json.get('query')
+    if not user_query:
+        return jsonify({"error": "No query provided"}), 400
+
+    try:
+        error, prepared = prepare_query(document_id, user_query)
+    except Exception as e:
+        print(f"Error querying document {document_id} with query '{user_query}': {e}")
+        return jsonify({"error": f"Error processing query: {e}. Please check server logs for details."}), 500
+    if error is not None:
+        return error
+
+    def events():
+        yield _sse_event('sources', prepared['sources'])
+        if prepared['answer'] is not None:
+            yield _sse_event('token', {'text': prepared['answer']})
+            yield _sse_event('done', {'answer': prepared['answer']})
+            return
+
+        pieces = []
+        try:
+            for piece in stream_answer_from_context(user_query, prepared['context']):
+                pieces.append(piece)
+                yield _sse_event('token', {'text': piece})
+        except Exception as e:
+            print(f"Error streaming the answer to '{user_query}' for document {document_id}: {e}")
+            yield _sse_event('error', {'error': f"An error occurred while generating the answer: {e}"})
+            return
+        answer = "".join(pieces).strip()
+        cache_answer(document_id, user_query, prepared, answer)
+        yield _sse_event('done', {'answer': answer})
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 if __name__ == '__main__':
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     with app.app_context():
+        print(f"Models loaded in: {model_registry.warm_up()}")
         load_faiss_on_startup()
 
-    app.run(debug=True)
\ No newline at end of file
+    # The reloader would run the startup above a second time, in a second process.
+    app.run(debug=True, use_reloader=False)
\ No newline at end of file
@@ -1,28 +1,32 @@
  # mindmap_generator.py
 import os
 import json
-import google.generativeai as genai
 from dotenv import load_dotenv
 import graphviz 
 import base64   
 import io       
 
+from llm_client import generate_content
+
 load_dotenv()
 
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
 MINDMAP_MODEL_NAME = "models/gemini-1.5-flash-latest"
 
-def generate_mind_map_data(text, max_new_tokens=1500):
+def error_image(message, width=200):
+    """An SVG data URI showing message in red, displayed in place of a mind map that could not be made."""
+    svg = f"<svg width='{width}' height='50'><text x='0' y='30' fill='red'>{message}</text></svg>"
+    return "data:image/svg+xml;base64," + base64.b64encode(svg.encode('utf-8')).decode('utf-8')
+
+
+def generate_mind_map_json(text, max_new_tokens=1500):
     """
-    Generates mind map data (nodes and links) using Google Gemini API,
-    then visualizes it as a PNG image.
+    Generates mind map data (nodes and links) using Google Gemini API.
+    Returns (mind map JSON, None), or (None, an SVG data URI describing the error).
     """
     api_key = os.getenv("GEMINI_API_KEY")
     if not api_key:
         print("Error: GEMINI_API_KEY is not set for mind map generation.")
-        return "data:image/svg+xml;base64," + base64.b64encode(b"<svg width='100' height='50'><text x='0' y='30' fill='red'>API Key Missing</text></svg>").decode('utf-8')
-
-    model = genai.GenerativeModel(MINDMAP_MODEL_NAME)
+        return None, error_image("API Key Missing", width=100)
 
     prompt = f"""
     Based on the following document content, extract key concepts/entities and the relationships between them.
@@ -52,9 +56,10 @@ def generate_mind_map_data(text, max_new_tokens=1500):
     """
 
     try:
-        response = model.generate_content(
+        response = generate_content(
             prompt,
-            generation_config=genai.types.GenerationConfig(
+            model_name=MINDMAP_MODEL_NAME,
+            generation_config=dict(
                 temperature=0.2,
                 max_output_tokens=max_new_tokens,
                 response_mime_type="application/json"
@@ -80,80 +85,84 @@ def generate_mind_map_data(text, max_new_tokens=1500):
                         raise ValueError("Missing 'nodes' or 'links' in extracted JSON.")
                 except Exception as ex:
                     print(f"Failed to extract JSON from malformed response: {ex}")
-                    return "data:image/svg+xml;base64," + base64.b64encode(b"<svg width='200' height='50'><text x='0' y='30' fill='red'>JSON Extraction Failed</text></svg>").decode('utf-8')
-            else:
-                return "data:image/svg+xml;base64," + base64.b64encode(b"<svg width='200' height='50'><text x='0' y='30' fill='red'>Invalid JSON Response</text></svg>").decode('utf-8')
-        
-        # Graphviz Visualization
-        dot = graphviz.Digraph(
-            comment='Mind Map',
-            format='png', # Output format
-            graph_attr={
-                'rankdir': 'LR', # Layout direction: Left to Right 
-                'bgcolor': '#f7f7f7', 
-                'overlap': 'false', 
-                'splines': 'true', # Draw curvy lines
-                'fontsize': '12',
-                'fontname': 'Roboto',
-                'margin': '0.5'
-            },
-            node_attr={
-                'shape': 'box', # Box shape for nodes
-                'style': 'filled',
-                'fillcolor': '#aed6f1', # Light blue nodes
-                'color': '#3498db', # Darker blue border
-                'fontname': 'Montserrat',
-                'fontsize': '14',
-                'penwidth': '2.0',
-                'margin': '0.2,0.1' # Padding inside node
-            },
-            edge_attr={
-                'color': '#7f8c8d', # Gray edges
-                'fontname': 'Roboto',
-                'fontsize': '10',
-                'fontcolor': '#555555'
-            }
-        )
-
-        # Adding nodes
-        for node_data in mind_map_json.get("nodes", []):
-            node_id = node_data.get("id")
-            node_type = node_data.get("type", "Concept") # Default type
-            
-            # Customize node colors based on type
-            if node_type == "Concept":
-                fill_color = '#aed6f1' 
-            elif node_type == "Person":
-                fill_color = '#d4aed1' 
-            elif node_type == "Organization":
-                fill_color = '#aed1c9' 
-            elif node_type == "Event":
-                fill_color = '#f1c40f' 
+                    return None, error_image("JSON Extraction Failed")
             else:
-                fill_color = '#f1d4b1' 
+                return None, error_image("Invalid JSON Response")
+        return mind_map_json, None
 
-            if node_id: 
-                dot.node(str(node_id), label=str(node_id), fillcolor=fill_color)
-
-        # Adding edges
-        for link_data in mind_map_json.get("links", []):
-            source_id = link_data.get("source")
-            target_id = link_data.get("target")
-            relation = link_data.get("relation", "")
-
-            if source_id and target_id: 
-                dot.edge(str(source_id), str(target_id), label=str(relation))
-
-        # Rendering the graph to bytes
-        img_bytes = dot.pipe(format='png')
-
-        base64_img = base64.b64encode(img_bytes).decode('utf-8')
-
-        return f"data:image/png;base64,{base64_img}"
-        
     except Exception as e:
-        print(f"Error during Gemini API mind map data generation or Graphviz rendering: {e}")
-        return "data:image/svg+xml;base64," + base64.b64encode(b"<svg width='200' height='50'><text x='0' y='30' fill='red'>Generation Error</text></svg>").decode('utf-8')
+        print(f"Error during Gemini API mind map data generation: {e}")
+        return None, error_image("Generation Error")
+
+
+def render_mind_map(mind_map_json):
+    """Visualizes mind map JSON as a PNG image and returns it as a data URI."""
+    # Graphviz Visualization
+    dot = graphviz.Digraph(
+        comment='Mind Map',
+        format='png', # Output format
+        graph_attr={
+            'rankdir': 'LR', # Layout direction: Left to Right 
+            'bgcolor': '#f7f7f7', 
+            'overlap': 'false', 
+            'splines': 'true', # Draw curvy lines
+            'fontsize': '12',
+            'fontname': 'Roboto',
+            'margin': '0.5'
+        },
+        node_attr={
+            'shape': 'box', # Box shape for nodes
+            'style': 'filled',
+            'fillcolor': '#aed6f1', # Light blue nodes
+            'color': '#3498db', # Darker blue border
+            'fontname': 'Montserrat',
+            'fontsize': '14',
+            'penwidth': '2.0',
+            'margin': '0.2,0.1' # Padding inside node
+        },
+        edge_attr={
+            'color': '#7f8c8d', # Gray edges
+            'fontname': 'Roboto',
+            'fontsize': '10',
+            'fontcolor': '#555555'
+        }
+    )
+
+    # Adding nodes
+    for node_data in mind_map_json.get("nodes", []):
+        node_id = node_data.get("id")
+        node_type = node_data.get("type", "Concept") # Default type
+        
+        # Customize node colors based on type
+        if node_type == "Concept":
+            fill_color = '#aed6f1' 
+        elif node_type == "Person":
+            fill_color = '#d4aed1' 
+        elif node_type == "Organization":
+            fill_color = '#aed1c9' 
+        elif node_type == "Event":
+            fill_color = '#f1c40f' 
+        else:
+            fill_color = '#f1d4b1' 
+
+        if node_id: 
+            dot.node(str(node_id), label=str(node_id), fillcolor=fill_color)
+
+    # Adding edges
+    for link_data in mind_map_json.get("links", []):
+        source_id = link_data.get("source")
+        target_id = link_data.get("target")
+        relation = link_data.get("relation", "")
+
+        if source_id and target_id: 
+            dot.edge(str(source_id), str(target_id), label=str(relation))
+
+    # Rendering the graph to bytes
+    img_bytes = dot.pipe(format='png')
+
+    base64_img = base64.b64encode(img_bytes).decode('utf-8')
+
+    return f"data:image/png;base64,{base64_img}"
 
 # Local Testing the mind map generation function
 if __name__ == '__main__':
@@ -1,21 +1,24 @@
 # mistral_response.py 
 import base64
+import io
 import os
-import pickle
-import faiss
 import numpy as np
-import spacy
 from mistralai import Mistral 
+from PyPDF2 import PdfReader, PdfWriter
 from dotenv import load_dotenv
-from sentence_transformers import SentenceTransformer
 
 
 from create_chunks import sentence_based_chunking
+from embedding_cache import EmbeddingCache
+from ocr_cache import OCRPageCache, PageFingerprinter
+from index_manager import GlobalIndexManager
+from model_registry import embedding_model_id, get_embedder
+from query_batcher import QueryBatcher
+from bm25_index import BM25Index, reciprocal_rank_fusion
 
 # --- Global setup (load once) ---
 load_dotenv() 
-nlp = spacy.load("en_core_web_sm") 
-embedder = SentenceTransformer('all-MiniLM-L6-v2') 
+# Models (embedder, sentence segmenter) are loaded lazily, once per process, by model_registry.
 
 
 FAISS_INDEX_DIR = 'faiss_indexes'
@@ -24,143 +27,260 @@ os.makedirs(FAISS_INDEX_DIR, exist_ok=True)
 GLOBAL_DOCUMENT_STORE_PATH = os.path.join(FAISS_INDEX_DIR, 'global_document_store.pkl')
 GLOBAL_FAISS_INDEX_PATH = os.path.join(FAISS_INDEX_DIR, 'global_faiss_index.bin')
 
+# Index type: flat (exact), ivf_flat, ivf_pq or hnsw. Approximate types take over from the
+# flat index automatically once FAISS_PROMOTION_THRESHOLD vectors are stored.
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "flat")
+FAISS_PROMOTION_THRESHOLD = int(os.getenv("FAISS_PROMOTION_THRESHOLD", "100000"))
+FAISS_NPROBE = int(os.getenv("FAISS_NPROBE", "16"))
+FAISS_EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", "64"))
+
+EMBEDDING_CACHE_PATH = os.path.join('cache', 'embeddings.sqlite')
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "500000"))
+embedding_cache = EmbeddingCache(EMBEDDING_CACHE_PATH, embedding_model_id(), max_entries=EMBEDDING_CACHE_MAX_ENTRIES)
+
 # --- OCR Function ---
-def extract_text_with_ocr(pdf_path):
-    """Extract text from a PDF using Mistral (Kistral) OCR."""
+OCR_MODEL_NAME = "mistral-ocr-latest"
+OCR_CACHE_DIR = os.path.join('cache', 'ocr_pages')
+ocr_page_cache = OCRPageCache(OCR_CACHE_DIR, OCR_MODEL_NAME)
+OCR_PAGES_PER_REQUEST = int(os.getenv("OCR_PAGES_PER_REQUEST", "8"))
+
+def _ocr_pdf_bytes(client, pdf_bytes):
+    """Runs Mistral OCR on an in-memory PDF and returns the markdown of each page."""
+    base64_pdf = base64.b64encode(pdf_bytes).decode('utf-8')
+    ocr_response = client.ocr.process(
+        model=OCR_MODEL_NAME, 
+        document={
+            "type": "document_url", 
+            "document_url": f"data:application/pdf;base64,{base64_pdf}"
+        }
+    )
+    return [page.markdown for page in ocr_response.pages]
+
+def iter_pages_with_ocr(pdf_path, client=None, pages_per_request=None):
+    """
+    Yields the markdown of every page of a PDF, in order, as soon as it is available.
+    Pages that were OCR'd before (in this or any other document) are read from the
+    on-disk page cache; the rest are sent to Mistral OCR in groups of pages_per_request,
+    so the first pages are available long before the whole document is processed.
+    """
+    client = client or Mistral(api_key=os.getenv("MISTRAL_API_KEY"))
+    pages_per_request = pages_per_request or OCR_PAGES_PER_REQUEST
+
     try:
-        # Step 1: Encode PDF to base64
-        with open(pdf_path, "rb") as pdf_file:
-            base64_pdf = base64.b64encode(pdf_file.read()).decode('utf-8')
-    except FileNotFoundError:
-        return f"Error: The file {pdf_path} was not found."
+        pages = PdfReader(pdf_path).pages
+        page_count = len(pages)
     except Exception as e:
-        return f"Error reading file: {e}"
+        print(f"Could not split {pdf_path} into pages ({e}). Running OCR on the whole document without the page cache.")
+        with open(pdf_path, "rb") as pdf_file:
+            yield from _ocr_pdf_bytes(client, pdf_file.read())
+        return
+
+    # Pages are fingerprinted group by group, so OCR of the first group starts right away;
+    # objects shared between pages (fonts, images) are hashed once for the whole document.
+    fingerprinter = PageFingerprinter()
+    cached_pages = 0
+    for group_start in range(0, page_count, pages_per_request):
+        group = range(group_start, min(group_start + pages_per_request, page_count))
+        # page -> fingerprint, or the page number for a page that could not be fingerprinted (and is not cached)
+        keys = {i: _page_key(fingerprinter, pages[i], i) for i in group}
+        markdowns = [ocr_page_cache.get(keys[i]) if isinstance(keys[i], str) else None for i in group]
+        cached_pages += sum(1 for markdown in markdowns if markdown is not None)
+
+        # key -> first page with that content; repeated pages are only OCR'd once
+        missing = {}
+        for i, markdown in zip(group, markdowns):
+            if markdown is None:
+                missing.setdefault(keys[i], i)
+
+        if missing:
+            writer = PdfWriter()
+            for i in missing.values():
+                writer.add_page(pages[i])
+            buffer = io.BytesIO()
+            writer.write(buffer)
+            ocr_pages = _ocr_pdf_bytes(client, buffer.getvalue())
+            if len(ocr_pages) != len(missing):
+                raise Exception(f"OCR returned {len(ocr_pages)} pages for {len(missing)} submitted pages.")
+            for key, markdown in zip(missing, ocr_pages):
+                if isinstance(key, str):
+                    ocr_page_cache.put(key, markdown)
+            by_key = dict(zip(missing, ocr_pages))
+            markdowns = [markdown if markdown is not None else by_key[keys[i]]
+                         for i, markdown in zip(group, markdowns)]
 
+        yield from markdowns
+
+    print(f"OCR of {pdf_path}: {cached_pages} of {page_count} pages served from the page cache.")
+
+def _page_key(fingerprinter, page, page_number):
     try:
-        # Step 2: Call Mistral OCR
-        api_key = os.getenv("MISTRAL_API_KEY")
-        client = Mistral(api_key=api_key) 
-        if not api_key:
-            return "Error: MISTRAL_API_KEY is not set in the environment variables."
-            
-        
-        ocr_response = client.ocr.process(
-            model="mistral-ocr-latest", 
-            document={
-                "type": "document_url", 
-                "document_url": f"data:application/pdf;base64,{base64_pdf}"
-            }
-        )
-        # Step 3: Combine text from all pages
-        extracted_text = "\n\n".join([page.markdown for page in ocr_response.pages])
-        return extracted_text
+        return fingerprinter.fingerprint(page)
+    except Exception as e:
+        print(f"Could not fingerprint page {page_number + 1} ({e}). It is OCR'd without the page cache.")
+        return page_number
+
+def extract_pages_with_ocr(pdf_path, client=None):
+    """Extract the markdown of every page of a PDF using Mistral OCR and the page cache."""
+    return list(iter_pages_with_ocr(pdf_path, client=client))
+
+def extract_text_with_ocr(pdf_path):
+    """Extract text from a PDF using Mistral (Kistral) OCR."""
+    if not os.path.exists(pdf_path):
+        return f"Error: The file {pdf_path} was not found."
+
+    api_key = os.getenv("MISTRAL_API_KEY")
+    if not api_key:
+        return "Error: MISTRAL_API_KEY is not set in the environment variables."
 
+    try:
+        pages = extract_pages_with_ocr(pdf_path, client=Mistral(api_key=api_key))
+        # Combine text from all pages
+        return "\n\n".join(pages)
+    except OSError as e:
+        return f"Error reading file: {e}"
     except Exception as e:
-        
         raise Exception(f"Error during OCR processing: {e}")
 
 # --- Embedding Function ---
 def embed_chunks_batched(chunks, batch_size=32):
-    """Generates embeddings for a list of text chunks in batches."""
-    embeddings = []
+    """
+    Generates embeddings for a list of text chunks in batches.
+    Chunks already in the embedding cache (e.g. re-uploads, repeated boilerplate pages)
+    are not re-encoded, and identical chunks within the list are encoded once.
+    The rest are encoded longest first, so each batch holds chunks of similar length
+    and little compute is spent on padding; results are written straight into the output array.
+    """
     if not chunks:
         return np.array([]).astype('float32')
-    for i in range(0, len(chunks), batch_size):
-        batch = chunks[i:i+batch_size]
-        batch_embeds = embedder.encode(batch, convert_to_numpy=True)
-        embeddings.extend(batch_embeds)
-    return np.array(embeddings).astype('float32')
+
+    keys = [embedding_cache.key(chunk) for chunk in chunks]
+    cached = embedding_cache.get_many(keys)
+    embedder = get_embedder()
+    embeddings = np.empty((len(chunks), embedder.get_sentence_embedding_dimension()), dtype='float32')
+
+    # key -> positions in chunks that still need an embedding
+    missing = {}
+    for i, (key, vector) in enumerate(zip(keys, cached)):
+        if vector is None:
+            missing.setdefault(key, []).append(i)
+        else:
+            embeddings[i] = vector
+
+    missing_keys = sorted(missing, key=lambda key: len(chunks[missing[key][0]]), reverse=True)
+    for start in range(0, len(missing_keys), batch_size):
+        batch_keys = missing_keys[start:start+batch_size]
+        batch = [chunks[missing[key][0]] for key in batch_keys]
+        batch_embeds = embedder.encode(batch, batch_size=len(batch), convert_to_numpy=True)
+        for key, vector in zip(batch_keys, batch_embeds):
+            embeddings[missing[key]] = vector
+        embedding_cache.put_many(batch_keys, batch_embeds)
+
+    stats = embedding_cache.stats()
+    print(f"Embedded {len(chunks)} chunks ({len(chunks) - len(missing_keys)} from cache). "
+          f"Embedding cache hit rate: {stats['hit_rate']:.1%} over {stats['hits'] + stats['misses']} lookups.")
+    return embeddings
 
 # --- FAISS Management Functions ---
+def _embedding_dimension():
+    return get_embedder().get_sentence_embedding_dimension()
+
+# A single process-resident manager: the index is read from disk once and then served from memory.
+# The legacy whole-file index and pickle are migrated into its snapshot + log layout on first load.
+global_index_manager = GlobalIndexManager(
+    FAISS_INDEX_DIR,
+    _embedding_dimension,
+    legacy_index_path=GLOBAL_FAISS_INDEX_PATH,
+    legacy_doc_store_path=GLOBAL_DOCUMENT_STORE_PATH,
+    index_type=FAISS_INDEX_TYPE,
+    promotion_threshold=FAISS_PROMOTION_THRESHOLD,
+    nprobe=FAISS_NPROBE,
+    ef_search=FAISS_EF_SEARCH
+)
+
+# Hybrid retrieval: a BM25 index over the same chunks finds exact terms (acronyms, formula
+# names, section numbers) that dense search misses; both rankings are fused with RRF.
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "1") == "1"
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+bm25_index = BM25Index(load_chunks=global_index_manager.document_chunks)
+
 def load_global_faiss_index():
-    """Loads the global FAISS index and document store from disk."""
-    index = None
-    doc_store = {} 
-    
-    if os.path.exists(GLOBAL_FAISS_INDEX_PATH) and os.path.exists(GLOBAL_DOCUMENT_STORE_PATH):
-        try:
-            index = faiss.read_index(GLOBAL_FAISS_INDEX_PATH)
-            with open(GLOBAL_DOCUMENT_STORE_PATH, 'rb') as f:
-                doc_store = pickle.load(f)
-            print("Global FAISS index and document store loaded successfully.")
-        except Exception as e:
-            print(f"Error loading global FAISS index or document store: {e}. Starting fresh.")
-            index = None 
-            doc_store = {}
-    
-
-    if index is None:
-        print("No existing FAISS index found or failed to load. Initializing new index.")
-        
-        dummy_embedding = embedder.encode(["test"], convert_to_numpy=True)[0]
-        dimension = len(dummy_embedding)
-        index = faiss.IndexFlatL2(dimension)
-        
-    
-    return index, doc_store
-
-def save_global_faiss_index(index, doc_store):
-    """Saves the global FAISS index and document store to disk."""
-    try:
-        faiss.write_index(index, GLOBAL_FAISS_INDEX_PATH)
-        with open(GLOBAL_DOCUMENT_STORE_PATH, 'wb') as f:
-            pickle.dump(doc_store, f)
-        print(f"Global FAISS index saved to {GLOBAL_FAISS_INDEX_PATH}")
-        print(f"Global document store saved to {GLOBAL_DOCUMENT_STORE_PATH}")
-    except Exception as e:
-        print(f"Error saving global FAISS index or document store: {e}")
+    """
+    Returns the in-memory global FAISS index and the memory-mapped chunk store,
+    loading them from disk only the first time this is called in the process.
+    """
+    global_index_manager.ensure_loaded()
+    with global_index_manager.reading() as (index, chunk_store):
+        return index, chunk_store
+
+def save_global_faiss_index():
+    """Compacts the append-only log of the global FAISS index into a fresh snapshot on disk."""
+    global_index_manager.compact()
 
 def add_chunks_to_global_faiss(chunks, document_id, original_filename):
     """
-    Adds a list of text chunks to the global FAISS index and document store.
-    Returns the updated global index and document store.
+    Adds a list of text chunks to the in-memory global FAISS index and document store.
+    Only the new vectors and chunk records are written to disk (appended to the index log).
+    Returns the number of chunks added.
     """
-    global_index, global_doc_store = load_global_faiss_index()
-
     new_embeddings = embed_chunks_batched(chunks)
-    
+    return add_embeddings_to_global_faiss(chunks, new_embeddings, document_id, original_filename)
+
+def add_embeddings_to_global_faiss(chunks, new_embeddings, document_id, original_filename):
+    """Adds already embedded chunks to the global FAISS index. Returns the number of chunks added."""
     if new_embeddings.size == 0: 
         print("No new embeddings generated for chunks. Skipping FAISS add.")
-        return global_index, global_doc_store
-
-    
-    start_id = global_index.ntotal
-
-    
-    global_index.add(new_embeddings)
+        return 0
 
-    
-    for i, chunk in enumerate(chunks):
-        global_faiss_id = start_id + i
-        global_doc_store[global_faiss_id] = {
+    records = [
+        {
             'chunk_text': chunk,
             'doc_id': document_id,
             'source_filename': original_filename
         }
-    
-    save_global_faiss_index(global_index, global_doc_store)
+        for chunk in chunks
+    ]
+    start_id = global_index_manager.add(new_embeddings, records)
+    bm25_index.add(document_id, range(start_id, start_id + len(chunks)), chunks)
     print(f"Added {len(chunks)} chunks to global FAISS index for document {document_id}.")
-    return global_index, global_doc_store
+    return len(chunks)
 
-def search_global_faiss_index(query_text, k=5):
+def _encode_queries(texts):
+    return get_embedder().encode(texts, batch_size=len(texts), convert_to_numpy=True).astype('float32')
+
+# Concurrent queries arriving within QUERY_BATCH_WAIT_MS of each other share one encode and one search per document.
+QUERY_BATCH_SIZE = int(os.getenv("QUERY_BATCH_SIZE", "64"))
+QUERY_BATCH_WAIT_MS = float(os.getenv("QUERY_BATCH_WAIT_MS", "3"))
+query_batcher = QueryBatcher(_encode_queries, global_index_manager.search,
+                             max_batch_size=QUERY_BATCH_SIZE, max_wait=QUERY_BATCH_WAIT_MS / 1000)
+
+def search_global_faiss_index(query_text, k=5, document_id=None):
     """
     Performs a similarity search on the global FAISS index for the given query.
+    If document_id is given, only chunks of that document are searched.
     Returns the top k most relevant text chunks.
     """
-    global_index, global_doc_store = load_global_faiss_index()
+    hits, _ = retrieve_chunks(query_text, k, document_id)
+    return [record["chunk_text"] for _, record in hits]
 
-    if global_index is None or global_index.ntotal == 0 or not global_doc_store:
+def retrieve_chunks(query_text, k=5, document_id=None):
+    """
+    Like search_global_faiss_index, but returns ([(faiss_id, record), ...], query embedding),
+    best first; the embedding is None if the index is empty.
+    """
+    if global_index_manager.ntotal == 0:
         print("Global FAISS index or document store not loaded/empty. Cannot perform search.")
-        return []
-
-    query_embedding = embedder.encode([query_text], convert_to_numpy=True).astype('float32')
-    
-    # D: distances, I: indices of the retrieved vectors in the FAISS index
-    D, I = global_index.search(query_embedding, k)
-    
-    retrieved_chunks_info = []
-    # I[0] contains the indices for the first (and only) query
-    for idx in I[0]:
-        if idx != -1 and idx in global_doc_store: 
-            retrieved_chunks_info.append(global_doc_store[idx]["chunk_text"])
-    return retrieved_chunks_info
\ No newline at end of file
+        return [], None
+
+    candidates = max(k, HYBRID_CANDIDATES) if HYBRID_SEARCH else k
+    hits, query_embedding = query_batcher.search_with_embedding(query_text, candidates, doc_id=document_id)
+    if not HYBRID_SEARCH:
+        return [(idx, record) for idx, _, record in hits[:k]], query_embedding
+
+    lexical_hits = bm25_index.search(query_text, candidates, doc_id=document_id)
+    fused_ids = reciprocal_rank_fusion([[idx for idx, _, _ in hits], [idx for idx, _ in lexical_hits]], k, RRF_K)
+    records = {idx: record for idx, _, record in hits}
+    lexical_only = [idx for idx in fused_ids if idx not in records]
+    if lexical_only:
+        records.update(zip(lexical_only, global_index_manager.records(lexical_only)))
+    return [(idx, records[idx]) for idx in fused_ids if records.get(idx)], query_embedding
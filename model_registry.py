@@ -0,0 +1,123 @@
+# model_registry.py
+"""
+Process-wide registry of the heavy models (sentence embedder, spaCy segmenter, local summarizer).
+
+Each model is registered with a loader and loaded at most once per process: on first use
+via get(), or up front via warm_up() (PRELOAD_MODELS=1), so that the first request
+does not pay for loading them.
+"""
+import os
+import threading
+import time
+
+EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
+
+# Inference backend of the sentence embedder:
+#   torch     - the PyTorch model as published (default)
+#   quantized - the PyTorch model with its Linear layers dynamically quantized to int8, on the CPU
+#   onnx      - the model run by ONNX Runtime; EMBEDDING_ONNX_FILE picks a specific export,
+#               e.g. onnx/model_qint8_avx512_vnni.onnx for a pre-quantized one
+EMBEDDING_BACKENDS = ('torch', 'quantized', 'onnx')
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE")
+# Intra-op threads used by one encode call; 0 keeps the library default (all cores).
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))
+
+_loaders = {}
+_models = {}
+_load_times = {}
+_locks = {}
+_registry_lock = threading.Lock()
+
+
+def register(name, loader):
+    """Registers a zero-argument loader for name. Registering a loaded name again keeps the loaded model."""
+    with _registry_lock:
+        _loaders[name] = loader
+        _locks.setdefault(name, threading.Lock())
+
+
+def get(name):
+    """Returns the model registered as name, loading it on first use."""
+    model = _models.get(name)
+    if model is not None:
+        return model
+    with _registry_lock:
+        if name not in _loaders:
+            raise KeyError(f"No model registered as '{name}'.")
+        lock = _locks[name]
+    # Per-model lock: concurrent first uses wait for a single load, other models load in parallel.
+    with lock:
+        if name not in _models:
+            started = time.perf_counter()
+            print(f"Loading model '{name}'...")
+            _models[name] = _loaders[name]()
+            _load_times[name] = round(time.perf_counter() - started, 3)
+            print(f"Loaded model '{name}' in {_load_times[name]:.2f}s.")
+        return _models[name]
+
+
+def is_loaded(name):
+    return name in _models
+
+
+def warm_up(names=None):
+    """Loads the given (default: all registered) models now. Returns {name: load seconds}."""
+    with _registry_lock:
+        names = list(_loaders) if names is None else list(names)
+    for name in names:
+        get(name)
+    return load_times()
+
+
+def load_times():
+    """Seconds each loaded model took to load."""
+    return dict(_load_times)
+
+
+def embedding_model_id(backend=None):
+    """
+    Identifies the embedder's model and backend. Backends produce slightly different
+    vectors, so this (not just the model name) keys the embedding cache.
+    """
+    backend = backend or EMBEDDING_BACKEND
+    if backend == 'torch':
+        return EMBEDDING_MODEL_NAME
+    if backend == 'onnx' and EMBEDDING_ONNX_FILE:
+        return f"{EMBEDDING_MODEL_NAME}:onnx:{EMBEDDING_ONNX_FILE}"
+    return f"{EMBEDDING_MODEL_NAME}:{backend}"
+
+
+def load_embedder(backend=None, threads=None):
+    """Loads the SentenceTransformer embedder with the given (default: configured) backend."""
+    from sentence_transformers import SentenceTransformer
+
+    backend = backend or EMBEDDING_BACKEND
+    threads = EMBEDDING_THREADS if threads is None else threads
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown EMBEDDING_BACKEND '{backend}'. Expected one of {', '.join(EMBEDDING_BACKENDS)}.")
+
+    if backend == 'onnx':
+        import onnxruntime
+        session_options = onnxruntime.SessionOptions()
+        if threads:
+            session_options.intra_op_num_threads = threads
+        model_kwargs = {'provider': 'CPUExecutionProvider', 'session_options': session_options}
+        if EMBEDDING_ONNX_FILE:
+            model_kwargs['file_name'] = EMBEDDING_ONNX_FILE
+        return SentenceTransformer(EMBEDDING_MODEL_NAME, backend='onnx', model_kwargs=model_kwargs)
+
+    import torch
+    if threads:
+        torch.set_num_threads(threads)
+    if backend == 'quantized':
+        model = SentenceTransformer(EMBEDDING_MODEL_NAME, device='cpu')
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return SentenceTransformer(EMBEDDING_MODEL_NAME)
+
+
+register('embedder', load_embedder)
+
+
+def get_embedder():
+    return get('embedder')
@@ -0,0 +1,154 @@
+# ocr_cache.py
+import hashlib
+import os
+import tempfile
+
+from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject, StreamObject
+
+
+# The parts of a page that determine what it looks like. Annotations (whose link destinations
+# point at other pages) and the /Parent and /P back references would pull other pages into a
+# page's hash, so editing one page would change the fingerprint of every page linked to it.
+_PAGE_CONTENT_KEYS = ('/Contents', '/Resources')
+_SKIPPED_KEYS = frozenset(('/Parent', '/P', '/Annots'))
+
+
+def _ref_key(ref):
+    return ref.idnum, ref.generation
+
+
+def _dict_items(obj):
+    return [(key, obj.raw_get(key)) for key in sorted(obj.keys()) if key not in _SKIPPED_KEYS]
+
+
+def _references(obj):
+    """The indirect references directly inside obj (not inside the objects they point to)."""
+    references = []
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, IndirectObject):
+            references.append(item)
+        elif isinstance(item, DictionaryObject):
+            stack.extend(value for _, value in _dict_items(item))
+        elif isinstance(item, ArrayObject):
+            stack.extend(item)
+    return references
+
+
+class PageFingerprinter:
+    """
+    Fingerprints the pages of one PDF. The digest of every indirect object (a font or image
+    shared by many pages, say) is computed once and reused, and objects are walked with an
+    explicit stack, so deeply nested documents cannot exhaust the recursion limit.
+    """
+
+    def __init__(self):
+        # (idnum, generation) -> digest of the object's canonical serialization
+        self._digests = {}
+
+    def fingerprint(self, page):
+        """
+        Returns a SHA-256 hex digest of a PDF page's content: its content streams and the
+        resources (fonts, images) it uses. Identical pages hash identically across documents.
+        """
+        digest = hashlib.sha256()
+        for key in _PAGE_CONTENT_KEYS:
+            digest.update(key.encode('utf-8'))
+            if key in page:
+                digest.update(self._digest(page.raw_get(key)))
+            else:
+                digest.update(b'<none>')
+        return digest.hexdigest()
+
+    def _digest(self, obj):
+        """Digest of a direct or indirect object, computing the digests of the objects it references first."""
+        pending = _references(obj)
+        in_progress = set()
+        while pending:
+            ref = pending[-1]
+            key = _ref_key(ref)
+            if key in self._digests:
+                pending.pop()
+                continue
+            if key not in in_progress:
+                in_progress.add(key)
+                children = [child for child in _references(ref.get_object())
+                            if _ref_key(child) not in self._digests and _ref_key(child) not in in_progress]
+                if children:
+                    pending.extend(children)
+                    continue
+            # Every referenced object is digested now, except those on a reference cycle.
+            self._digests[key] = self._serialize(ref.get_object())
+            in_progress.discard(key)
+            pending.pop()
+        if isinstance(obj, IndirectObject):
+            return self._digests[_ref_key(obj)]
+        return self._serialize(obj)
+
+    def _serialize(self, obj):
+        """Digest of a canonical serialization of obj, with references replaced by the digests of their objects."""
+        digest = hashlib.sha256()
+        # Items are PDF objects, or ('raw', bytes) markers fed to the digest as is.
+        stack = [obj]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, tuple):
+                digest.update(item[1])
+            elif isinstance(item, IndirectObject):
+                digest.update(b'<ref>' + self._digests.get(_ref_key(item), b'<cycle>'))
+            elif isinstance(item, DictionaryObject):
+                # Pushed in reverse, so that they are hashed in order.
+                if isinstance(item, StreamObject):
+                    stack.append(('raw', item.get_data()))
+                stack.append(('raw', b'>>'))
+                for key, value in reversed(_dict_items(item)):
+                    stack.append(value)
+                    stack.append(('raw', str(key).encode('utf-8')))
+                stack.append(('raw', b'<stream><<' if isinstance(item, StreamObject) else b'<<'))
+            elif isinstance(item, ArrayObject):
+                stack.append(('raw', b']'))
+                stack.extend(reversed(item))
+                stack.append(('raw', b'['))
+            else:
+                digest.update(repr(item).encode('utf-8'))
+        return digest.digest()
+
+
+def page_fingerprint(page):
+    """Fingerprint of a single page; use one PageFingerprinter for the pages of a document."""
+    return PageFingerprinter().fingerprint(page)
+
+
+class OCRPageCache:
+    """On-disk cache of OCR markdown per page, keyed by page fingerprint and OCR model."""
+
+    def __init__(self, directory, model_name):
+        self.directory = directory
+        self.model_name = model_name
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, fingerprint):
+        key = hashlib.sha256(f"{self.model_name}\0{fingerprint}".encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, key[:2], f"{key}.md")
+
+    def get(self, fingerprint):
+        path = self._path(fingerprint)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def put(self, fingerprint, markdown):
+        path = self._path(fingerprint)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Concurrent uploads may OCR the same page; each writer needs its own temporary file.
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f"{os.path.basename(path)}.", suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(markdown)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
@@ -1,12 +1,12 @@
 # qna_generator.py
 import os
 import json
-import google.generativeai as genai
 from dotenv import load_dotenv
 
+from llm_client import generate_content, stream_content
+
 load_dotenv()
 
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
 QNA_MODEL_NAME = "models/gemini-1.5-flash-latest"
 
 def generate_questions_answers(text, num_qa_pairs=3, max_new_tokens=1000):
@@ -18,8 +18,6 @@ def generate_questions_answers(text, num_qa_pairs=3, max_new_tokens=1000):
         print("Error: GEMINI_API_KEY is not set for Q&A generation.")
         return []
 
-    model = genai.GenerativeModel(QNA_MODEL_NAME)
-
     prompt = f"""
     Based on the following document content, generate {num_qa_pairs} distinct question-answer pairs that cover key information.
     The questions should be clear and the answers should be concise and directly derived from the text.
@@ -36,9 +34,10 @@ def generate_questions_answers(text, num_qa_pairs=3, max_new_tokens=1000):
     JSON Output:
     """
     try:
-        response = model.generate_content(
+        response = generate_content(
             prompt,
-            generation_config=genai.types.GenerationConfig(
+            model_name=QNA_MODEL_NAME,
+            generation_config=dict(
                 temperature=0.4,
                 max_output_tokens=max_new_tokens,
                 response_mime_type="application/json"
@@ -78,18 +77,8 @@ def generate_questions_answers(text, num_qa_pairs=3, max_new_tokens=1000):
         return []
     
 
-def answer_question_from_context(question, context, max_new_tokens=500):
-    """
-    Answers a specific question based *only* on the provided context using Google Gemini API.
-    """
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        print("Error: GEMINI_API_KEY is not set for Q&A generation.")
-        return "Error: API key not configured."
-
-    model = genai.GenerativeModel(QNA_MODEL_NAME) 
-
-    prompt = f"""
+def _answer_prompt(question, context):
+    return f"""
     Based *only* on the following context, answer the question accurately and concisely.
     If the answer cannot be found in the context, state that clearly and do not make up information.
 
@@ -100,15 +89,45 @@ def answer_question_from_context(question, context, max_new_tokens=500):
 
     Answer:
     """
+
+def _answer_generation_config(max_new_tokens):
+    return dict(
+        temperature=0.1, # Keeping temperature low for factual answers
+        max_output_tokens=max_new_tokens
+    )
+
+def answer_question_from_context(question, context, max_new_tokens=500):
+    """
+    Answers a specific question based *only* on the provided context using Google Gemini API.
+    """
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        print("Error: GEMINI_API_KEY is not set for Q&A generation.")
+        return "Error: API key not configured."
+
+    prompt = _answer_prompt(question, context)
     try:
-        response = model.generate_content(
+        response = generate_content(
             prompt,
-            generation_config=genai.types.GenerationConfig(
-                temperature=0.1, # Keeping temperature low for factual answers
-                max_output_tokens=max_new_tokens
-            )
+            model_name=QNA_MODEL_NAME,
+            generation_config=_answer_generation_config(max_new_tokens)
         )
         return response.text.strip()
     except Exception as e:
         print(f"Error during Gemini API answer generation from context: {e}")
-        return "An error occurred while generating the answer."
\ No newline at end of file
+        return "An error occurred while generating the answer."
+
+def stream_answer_from_context(question, context, max_new_tokens=500):
+    """
+    Streaming variant of answer_question_from_context: yields pieces of the answer as
+    Gemini generates them. Raises if the API key is missing or generation fails.
+    """
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        raise RuntimeError("API key not configured.")
+
+    yield from stream_content(
+        _answer_prompt(question, context),
+        model_name=QNA_MODEL_NAME,
+        generation_config=_answer_generation_config(max_new_tokens)
+    )
\ No newline at end of file
@@ -0,0 +1,128 @@
+# query_batcher.py
+import threading
+import time
+
+import numpy as np
+
+
+class _PendingQuery:
+    """A query waiting for the batcher. Its embedding is set by the batcher thread, its hits by a caller."""
+
+    def __init__(self, text, k, doc_id):
+        self.text = text
+        self.k = k
+        self.doc_id = doc_id
+        self.hits = None
+        self.embedding = None
+        self.error = None
+        # Queries of one batch on the same document, searched together by the first of them.
+        self.group = None
+        self.encoded = threading.Event()
+        self.done = threading.Event()
+
+
+class QueryBatcher:
+    """
+    Micro-batches concurrent searches. Queries arriving within max_wait seconds of each
+    other (up to max_batch_size) are encoded in one forward pass, and queries on the same
+    document share one multi-row index search; each caller gets back only its own hits.
+
+    Only encoding runs on the batcher thread. Each document's search runs on the thread of
+    the first caller querying it, so searches on different documents run in parallel
+    (FAISS releases the GIL).
+
+    encode_fn(texts) returns a float32 array with one row per text;
+    search_fn(query_embeddings, k, doc_id=None) returns one hit list per row
+    (see GlobalIndexManager.search).
+    """
+
+    def __init__(self, encode_fn, search_fn, max_batch_size=64, max_wait=0.003):
+        self.encode_fn = encode_fn
+        self.search_fn = search_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._cond = threading.Condition()
+        self._pending = []
+        self._thread = None
+        self.batches = 0
+        self.queries = 0
+
+    def _ensure_started(self):
+        """Starts the batching thread on first use. Must be called with _cond held."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="query-batcher", daemon=True)
+        self._thread.start()
+
+    def search(self, text, k, doc_id=None):
+        """Searches for text as part of the next batch and returns its list of (faiss_id, distance, record)."""
+        return self.search_with_embedding(text, k, doc_id)[0]
+
+    def search_with_embedding(self, text, k, doc_id=None):
+        """Like search(), but returns (hits, query embedding)."""
+        pending = _PendingQuery(text, k, doc_id)
+        with self._cond:
+            self._ensure_started()
+            self._pending.append(pending)
+            self._cond.notify_all()
+        pending.encoded.wait()
+        if pending.error is None and pending.group[0] is pending:
+            self._search_group(pending.group)
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.hits, pending.embedding
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            # Give concurrent callers a few milliseconds to join the batch.
+            deadline = time.monotonic() + self.max_wait
+            while len(self._pending) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = self._pending[:self.max_batch_size]
+            del self._pending[:self.max_batch_size]
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                self._encode_batch(batch)
+            except Exception as e:
+                for pending in batch:
+                    pending.error = e
+                    pending.done.set()
+            finally:
+                for pending in batch:
+                    pending.encoded.set()
+
+    def _encode_batch(self, batch):
+        embeddings = self.encode_fn([pending.text for pending in batch])
+        groups = {}
+        for row, pending in enumerate(batch):
+            pending.embedding = embeddings[row]
+            groups.setdefault(pending.doc_id, []).append(pending)
+        for group in groups.values():
+            for pending in group:
+                pending.group = group
+        self.batches += 1
+        self.queries += len(batch)
+
+    def _search_group(self, group):
+        """Runs one multi-row search for queries on the same document and completes them."""
+        try:
+            k = max(pending.k for pending in group)
+            results = self.search_fn(np.stack([pending.embedding for pending in group]), k, doc_id=group[0].doc_id)
+            for pending, hits in zip(group, results):
+                pending.hits = hits[:pending.k]
+        except Exception as e:
+            for pending in group:
+                pending.error = e
+        finally:
+            for pending in group:
+                pending.done.set()
@@ -1,11 +1,9 @@
 # question_generator.py
-import os
-from groq import Groq
 from dotenv import load_dotenv
-load_dotenv()
 
-# Set your Groq API key
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+from llm_client import groq_chat
+
+load_dotenv()
 
 
 def generate_questions_from_chunk(chunk, question_type, difficulty):
@@ -17,10 +15,4 @@ def generate_questions_from_chunk(chunk, question_type, difficulty):
     Output only the questions.
     """
 
-    response = client.chat.completions.create(
-        model="mixtral-8x7b-32768",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.7
-    )
-
-    return response.choices[0].message.content.strip()
+    return groq_chat(prompt, model_name="mixtral-8x7b-32768", temperature=0.7)
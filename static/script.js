@@ -23,6 +23,98 @@ document.addEventListener('DOMContentLoaded', function() {
             const querySpinner = document.getElementById('querySpinner');
 
             let documentId = null;
+            let statusSource = null;
+            let statusPollTimer = null;
+
+            function describeStatus(status) {
+                const progress = status.progress || {};
+                const stages = status.stages || {};
+                const parts = [];
+                for (const name of ['ocr', 'chunking', 'embedding', 'indexing', 'summary']) {
+                    const stage = stages[name];
+                    if (!stage) continue;
+                    let text = `${name}: ${stage.state}`;
+                    if (stage.duration !== null && stage.duration !== undefined) {
+                        text += ` (${stage.duration.toFixed(1)}s)`;
+                    }
+                    parts.push(text);
+                }
+                let summary = parts.join(' | ');
+                if (progress.pages_ocrd || progress.chunks_indexed) {
+                    summary += ` — ${progress.pages_ocrd || 0} pages OCR'd, ${progress.chunks_indexed || 0} chunks indexed`;
+                }
+                return summary || `Processing: ${status.state}`;
+            }
+
+            function applyStatus(status) {
+                if (status.document_id !== documentId) return;
+                const progress = status.progress || {};
+                const stages = status.stages || {};
+                const finished = ['completed', 'degraded', 'failed'].includes(status.state);
+                // 'degraded': indexed and queryable, but the summary could not be generated
+                const indexed = status.state === 'completed' || status.state === 'degraded';
+
+                uploadStatus.textContent = describeStatus(status);
+                uploadStatus.style.color = status.state === 'failed' ? 'red'
+                    : (status.state === 'degraded' ? 'orange' : (finished ? 'green' : 'blue'));
+
+                // Questions can be asked as soon as the first chunks are searchable
+                if (progress.chunks_indexed > 0 || indexed) {
+                    queryDocumentButton.disabled = false;
+                }
+                // Flashcards, Q&A and mind map are generated from the summary
+                const summaryReady = (stages.summary && stages.summary.state === 'completed') || status.summary_ready;
+                if (summaryReady || status.state === 'completed') {
+                    featureButtons.forEach(button => button.disabled = false);
+                }
+                if (finished) {
+                    stopWatchingStatus();
+                }
+            }
+
+            function stopWatchingStatus() {
+                if (statusSource) {
+                    statusSource.close();
+                    statusSource = null;
+                }
+                if (statusPollTimer) {
+                    clearInterval(statusPollTimer);
+                    statusPollTimer = null;
+                }
+            }
+
+            function pollStatus(id) {
+                statusPollTimer = setInterval(() => {
+                    fetch(`/status/${id}`)
+                        .then(response => response.json())
+                        .then(status => {
+                            if (status.error) {
+                                stopWatchingStatus();
+                                return;
+                            }
+                            applyStatus(status);
+                        })
+                        .catch(error => console.error('Error fetching processing status:', error));
+                }, 2000);
+            }
+
+            function watchProcessingStatus(id) {
+                stopWatchingStatus();
+                if (!window.EventSource) {
+                    pollStatus(id);
+                    return;
+                }
+                statusSource = new EventSource(`/status/${id}/events`);
+                statusSource.onmessage = event => applyStatus(JSON.parse(event.data));
+                statusSource.onerror = () => {
+                    // The stream ends once processing finishes; fall back to polling if it dropped early
+                    if (statusSource) {
+                        statusSource.close();
+                        statusSource = null;
+                        pollStatus(id);
+                    }
+                };
+            }
 
             uploadForm.addEventListener('submit', function(e) {
                 e.preventDefault();
@@ -43,6 +135,10 @@ document.addEventListener('DOMContentLoaded', function() {
                 uploadStatus.textContent = 'Uploading and processing... This may take a moment.';
                 uploadStatus.style.color = 'blue';
 
+                stopWatchingStatus();
+                featureButtons.forEach(button => button.disabled = true);
+                queryDocumentButton.disabled = true;
+
                 // Clear previous outputs when a new document is uploaded
                 for (const key in outputAreas) {
                     outputAreas[key].innerHTML = '';
@@ -67,9 +163,9 @@ document.addEventListener('DOMContentLoaded', function() {
                         documentId = data.document_id;
                         uploadStatus.textContent = data.message;
                         uploadStatus.style.color = 'green';
-                        // Enable feature buttons once document is processed
-                        featureButtons.forEach(button => button.disabled = false);
-                        queryDocumentButton.disabled = false; // Enable query button
+                        // A duplicate may still be processing its first upload; its status
+                        // tells which features are available.
+                        watchProcessingStatus(documentId);
                     }
                 })
                 .catch(error => {
@@ -207,49 +303,106 @@ document.addEventListener('DOMContentLoaded', function() {
                         return;
                     }
 
-                    const apiUrl = `/query_document/${documentId}`;
-
                     // Disable button, show spinner, clear output
                     this.disabled = true;
                     queryOutput.innerHTML = '';
                     querySpinner.style.display = 'block';
 
-                    fetch(apiUrl, {
-                        method: 'POST',
-                        headers: {
-                            'Content-Type': 'application/json',
-                        },
-                        body: JSON.stringify({ query: userQuery })
-                    })
-                    .then(response => {
-                        if (!response.ok) {
-                            return response.json().then(errData => {
-                                throw new Error(errData.error || `HTTP error! status: ${response.status}`);
-                            });
-                        }
-                        return response.json();
-                    })
-                    .then(data => {
+                    const finish = () => {
                         querySpinner.style.display = 'none';
                         this.disabled = false;
+                    };
 
-                        if (data.error) {
-                            queryOutput.innerHTML = `<p style="color: red;">Error: ${data.error}</p>`;
-                        } else if (data.answer) {
-                            queryOutput.innerHTML = `<p><strong>Answer:</strong> ${data.answer}</p>`;
-                        } else {
-                            queryOutput.innerHTML = '<p>No answer could be generated for your question.</p>';
-                        }
-                    })
+                    askDocument(documentId, userQuery)
+                    .then(finish)
                     .catch(error => {
-                        querySpinner.style.display = 'none';
-                        this.disabled = false;
+                        finish();
                         console.error('Error querying document:', error);
                         queryOutput.innerHTML = `<p style="color: red;">Failed to get answer: ${error.message || error}. Please check server logs.</p>`;
                     });
                 });
             }
 
+            // Streams the answer from /query_document/<id>/stream: the sources arrive first,
+            // then the answer text piece by piece as the model generates it.
+            function askDocument(docId, userQuery) {
+                return fetch(`/query_document/${docId}/stream`, {
+                    method: 'POST',
+                    headers: {
+                        'Content-Type': 'application/json',
+                    },
+                    body: JSON.stringify({ query: userQuery })
+                })
+                .then(response => {
+                    if (!response.ok) {
+                        return response.json().then(errData => {
+                            throw new Error(errData.error || `HTTP error! status: ${response.status}`);
+                        });
+                    }
+
+                    queryOutput.innerHTML = '<p><strong>Answer:</strong> <span class="answer-text"></span></p>';
+                    const answerText = queryOutput.querySelector('.answer-text');
+                    const reader = response.body.getReader();
+                    const decoder = new TextDecoder();
+                    let buffer = '';
+                    let answered = false;
+
+                    const handleEvent = (eventName, data) => {
+                        if (eventName === 'sources') {
+                            if (data.length) {
+                                const sources = document.createElement('details');
+                                sources.innerHTML = `<summary>Sources (${data.length})</summary>`;
+                                data.forEach(source => {
+                                    const item = document.createElement('p');
+                                    item.textContent = source.text;
+                                    sources.appendChild(item);
+                                });
+                                queryOutput.appendChild(sources);
+                            }
+                        } else if (eventName === 'token') {
+                            querySpinner.style.display = 'none';
+                            answerText.textContent += data.text;
+                        } else if (eventName === 'done') {
+                            answered = true;
+                            if (!data.answer) {
+                                answerText.textContent = 'No answer could be generated for your question.';
+                            }
+                        } else if (eventName === 'error') {
+                            throw new Error(data.error);
+                        }
+                    };
+
+                    const read = () => reader.read().then(({ done, value }) => {
+                        if (done) {
+                            if (!answered) {
+                                throw new Error('The answer stream ended unexpectedly.');
+                            }
+                            return;
+                        }
+                        buffer += decoder.decode(value, { stream: true });
+                        let boundary;
+                        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                            const message = buffer.slice(0, boundary);
+                            buffer = buffer.slice(boundary + 2);
+                            let eventName = 'message';
+                            let dataLines = [];
+                            message.split('\n').forEach(line => {
+                                if (line.startsWith('event:')) {
+                                    eventName = line.slice(6).trim();
+                                } else if (line.startsWith('data:')) {
+                                    dataLines.push(line.slice(5).trim());
+                                }
+                            });
+                            if (dataLines.length) {
+                                handleEvent(eventName, JSON.parse(dataLines.join('\n')));
+                            }
+                        }
+                        return read();
+                    });
+                    return read();
+                });
+            }
+
             // Initially disable feature buttons until a document is uploaded
             featureButtons.forEach(button => button.disabled = true);
             queryDocumentButton.disabled = true; // Disable query button too
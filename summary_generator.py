@@ -1,83 +1,255 @@
 # summary_generator.py
 import os
+import time
 import requests
 import json
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+import model_registry
+from create_chunks import estimate_tokens, iter_sentence_chunks, sent_tokenize_spacy
+from model_registry import get_embedder
 
 load_dotenv()
 
 HF_API_TOKEN = os.getenv("HF_API_TOKEN")
-SUMMARY_API_URL = "https://api-inference.huggingface.co/models/sshleifer/distilbart-cnn-12-6"
+SUMMARY_MODEL_NAME = os.getenv("SUMMARY_MODEL_NAME", "sshleifer/distilbart-cnn-12-6")
+SUMMARY_API_URL = f"https://api-inference.huggingface.co/models/{SUMMARY_MODEL_NAME}"
 HEADERS = {"Authorization": f"Bearer {HF_API_TOKEN}"}
 
-def query_huggingface_api(api_url, payload):
-    if not HF_API_TOKEN:
-        return {"error": "HF_API_TOKEN is not set."}
+# Which summarizer runs the map steps:
+#   hf_api     - the hosted Inference API (default)
+#   local      - SUMMARY_MODEL_NAME run in-process on the CPU with transformers
+#   extractive - picks the most central sentences using the sentence embedder; no generative model
+SUMMARY_BACKEND = os.getenv("SUMMARY_BACKEND", "hf_api").lower()
+
+# Number of summarization requests in flight at once and chunks sent per request.
+SUMMARY_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", "4"))
+SUMMARY_BATCH_SIZE = int(os.getenv("SUMMARY_BATCH_SIZE", "4"))
+SUMMARY_MAX_RETRIES = int(os.getenv("SUMMARY_MAX_RETRIES", "5"))
+SUMMARY_REQUEST_TIMEOUT = float(os.getenv("SUMMARY_REQUEST_TIMEOUT", "120"))
+
+# Map-reduce budgets, in (estimated) model tokens: the input size of one summarization
+# request, and the size the final summary is reduced to before it is used in LLM prompts.
+SUMMARY_CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", "600"))
+SUMMARY_TARGET_TOKENS = int(os.getenv("SUMMARY_TARGET_TOKENS", "800"))
+SUMMARY_MAX_ROUNDS = int(os.getenv("SUMMARY_MAX_ROUNDS", "4"))
+
+# One pooled session so requests reuse their connections instead of opening a new one per chunk.
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=max(SUMMARY_CONCURRENCY, 1)))
+
+def _retry_delay(response, attempt):
+    """Seconds to wait before retrying: the model's estimated load time if given, else exponential backoff."""
     try:
-        response = requests.post(api_url, headers=HEADERS, json=payload)
-        response.raise_for_status() 
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        print(f"Hugging Face API Request Error: {response.status_code} {response.text} for url: {api_url}. Error: {e}")
-        return {"error": f"API request failed: {response.status_code} {response.text}"}
-    except json.JSONDecodeError as e:
-        print(f"Hugging Face API JSON Decode Error: {e}. Raw response: {response.text}")
-        return {"error": f"API returned invalid JSON: {e}"}
-
-def chunk_text(text, max_chunk_size=1000, overlap=100):
+        estimated_time = float(response.json().get("estimated_time", 0))
+    except (ValueError, AttributeError):
+        estimated_time = 0
+    return min(max(estimated_time, 2 ** attempt), 60)
+
+def query_huggingface_api(api_url, payload, max_retries=SUMMARY_MAX_RETRIES):
     """
-    Splits text into chunks of roughly max_chunk_size characters,
-    with an optional overlap to maintain context.
+    POSTs payload to the Inference API and returns the decoded JSON, or {"error": ...}.
+    Retries with backoff while the model is loading (503) or the API is rate limiting (429).
     """
-    if not text:
-        return []
-    
-    chunks = []
-    current_pos = 0
-    
-    while current_pos < len(text):
-        chunk = text[current_pos : current_pos + max_chunk_size]
-        chunks.append(chunk)
-        current_pos += max_chunk_size - overlap
-        if current_pos < 0: 
-            current_pos = 0 
-    return chunks
-
-def generate_summary(text, max_length=150, min_length=30):
-    """Generates a summary of the given text using Hugging Face Inference API."""
     if not HF_API_TOKEN:
-        return "Summarization service not available: Hugging Face API Token missing."
+        return {"error": "HF_API_TOKEN is not set."}
+    for attempt in range(max_retries + 1):
+        try:
+            response = _session.post(api_url, headers=HEADERS, json=payload, timeout=SUMMARY_REQUEST_TIMEOUT)
+        except requests.exceptions.RequestException as e:
+            print(f"Hugging Face API Request Error for url: {api_url}. Error: {e}")
+            return {"error": f"API request failed: {e}"}
+        if response.status_code in (429, 503) and attempt < max_retries:
+            delay = _retry_delay(response, attempt)
+            print(f"Hugging Face API returned {response.status_code}, retrying in {delay:.0f}s "
+                  f"(attempt {attempt + 1}/{max_retries})...")
+            time.sleep(delay)
+            continue
+        try:
+            response.raise_for_status()
+            return response.json()
+        except requests.exceptions.RequestException as e:
+            print(f"Hugging Face API Request Error: {response.status_code} {response.text} for url: {api_url}. Error: {e}")
+            return {"error": f"API request failed: {response.status_code} {response.text}"}
+        except json.JSONDecodeError as e:
+            print(f"Hugging Face API JSON Decode Error: {e}. Raw response: {response.text}")
+            return {"error": f"API returned invalid JSON: {e}"}
 
-    
-    text_chunks = chunk_text(text, max_chunk_size=700, overlap=50) 
+def split_text_by_tokens(text, max_tokens):
+    """
+    Splits text into chunks of at most about max_tokens tokens, cutting only between
+    sentences (a single sentence longer than the budget is cut between words).
+    """
+    # Paragraphs are segmented separately, so sentences never span a paragraph break.
+    paragraphs = [paragraph for paragraph in text.split("\n\n") if paragraph.strip()]
+    return list(iter_sentence_chunks(paragraphs, max_tokens=max_tokens))
 
-    summaries = []
-    for i, chunk in enumerate(text_chunks):
-        payload = {
-            "inputs": chunk,
-            "parameters": {
-                "max_length": max_length,
-                "min_length": min_length
-            }
-        }
-        
-        print(f"Summarizing chunk {i+1}/{len(text_chunks)} (length: {len(chunk)} chars)...")
-        response_data = query_huggingface_api(SUMMARY_API_URL, payload)
+def truncate_to_tokens(text, max_tokens):
+    """The leading sentences of text that fit in about max_tokens tokens."""
+    paragraphs = [paragraph for paragraph in text.split("\n\n") if paragraph.strip()]
+    # The first chunk is the longest run of whole sentences within the budget.
+    return next(iter_sentence_chunks(paragraphs, max_tokens=max_tokens), "")
+
+def _is_failed_summary(summary):
+    return summary.startswith("[Error summarizing") or summary.startswith("[Unexpected response")
+
+def _summarize_batch(batch_index, chunks, parameters):
+    """
+    Summarizes a batch of chunks with one request. Returns one summary (or error marker) per chunk.
+    Falls back to one request per chunk if the endpoint does not answer a multi-input request.
+    """
+    first = batch_index * SUMMARY_BATCH_SIZE + 1
+    print(f"Summarizing chunks {first}-{first + len(chunks) - 1} ({sum(len(c) for c in chunks)} chars)...")
+    if len(chunks) > 1:
+        response_data = query_huggingface_api(SUMMARY_API_URL, {"inputs": chunks, "parameters": parameters})
+        if isinstance(response_data, list) and len(response_data) == len(chunks):
+            return [_summary_text(item, first + i) for i, item in enumerate(response_data)]
+        print(f"Batched summarization failed for chunks starting at {first}, retrying one chunk per request.")
 
+    summaries = []
+    for i, chunk in enumerate(chunks):
+        response_data = query_huggingface_api(SUMMARY_API_URL, {"inputs": chunk, "parameters": parameters})
         if "error" in response_data:
-            print(f"Error summarizing chunk {i+1}: {response_data['error']}")
-            summaries.append(f"[Error summarizing chunk {i+1}]")
+            print(f"Error summarizing chunk {first + i}: {response_data['error']}")
+            summaries.append(f"[Error summarizing chunk {first + i}]")
         elif isinstance(response_data, list) and response_data:
-            summary_chunk = response_data[0].get('summary_text', '')
-            if summary_chunk:
-                summaries.append(summary_chunk)
+            summaries.append(_summary_text(response_data[0], first + i))
         else:
-            print(f"Unexpected response for chunk {i+1}: {response_data}")
-            summaries.append(f"[Unexpected response for chunk {i+1}]")
-
-    
-    full_summary = " ".join(summaries).strip()
-    
-    if not full_summary or full_summary.startswith("[Error summarizing"):
-        return "Could not generate a complete summary due to API errors or no content."
-    return full_summary
\ No newline at end of file
+            print(f"Unexpected response for chunk {first + i}: {response_data}")
+            summaries.append(f"[Unexpected response for chunk {first + i}]")
+    return summaries
+
+def _summary_text(item, chunk_number):
+    # Multi-input responses may nest each input's result in its own list.
+    if isinstance(item, list) and item:
+        item = item[0]
+    if isinstance(item, dict):
+        return item.get('summary_text', '')
+    print(f"Unexpected response for chunk {chunk_number}: {item}")
+    return f"[Unexpected response for chunk {chunk_number}]"
+
+# --- Local backends ---
+def _load_local_pipeline():
+    from transformers import pipeline
+    return pipeline("summarization", model=SUMMARY_MODEL_NAME, device=-1)
+
+# Loaded once per process, on first use (see model_registry); only registered when selected.
+if SUMMARY_BACKEND == 'local':
+    model_registry.register('summarizer', _load_local_pipeline)
+
+def _summarize_batch_local(batch_index, chunks, parameters):
+    """Summarizes a batch of chunks with one batched forward pass of the local model."""
+    first = batch_index * SUMMARY_BATCH_SIZE + 1
+    print(f"Summarizing chunks {first}-{first + len(chunks) - 1} locally ({sum(len(c) for c in chunks)} chars)...")
+    try:
+        results = model_registry.get('summarizer')(chunks, truncation=True, batch_size=len(chunks), **parameters)
+    except Exception as e:
+        print(f"Error summarizing chunks {first}-{first + len(chunks) - 1} locally: {e}")
+        return [f"[Error summarizing chunk {first + i}]" for i in range(len(chunks))]
+    return [_summary_text(item, first + i) for i, item in enumerate(results)]
+
+def _summarize_batch_extractive(batch_index, chunks, parameters):
+    """
+    Extractive summary of each chunk: its sentences ranked by centrality (summed cosine
+    similarity to the chunk's other sentences), kept up to max_length tokens, in original order.
+    """
+    first = batch_index * SUMMARY_BATCH_SIZE + 1
+    print(f"Extracting summaries of chunks {first}-{first + len(chunks) - 1} ({sum(len(c) for c in chunks)} chars)...")
+    sentences_per_chunk = [sent_tokenize_spacy(chunk) for chunk in chunks]
+    all_sentences = [sentence for sentences in sentences_per_chunk for sentence in sentences]
+    if not all_sentences:
+        return ['' for _ in chunks]
+    # One encode call for the whole batch.
+    embeddings = get_embedder().encode(all_sentences, convert_to_numpy=True, normalize_embeddings=True)
+
+    summaries = []
+    offset = 0
+    for sentences in sentences_per_chunk:
+        chunk_embeddings = embeddings[offset:offset + len(sentences)]
+        offset += len(sentences)
+        if not sentences:
+            summaries.append('')
+            continue
+        centrality = (chunk_embeddings @ chunk_embeddings.T).sum(axis=1)
+        selected = []
+        used_tokens = 0
+        for i in centrality.argsort()[::-1]:
+            tokens = estimate_tokens(sentences[i])
+            if selected and used_tokens + tokens > parameters["max_length"]:
+                break
+            selected.append(i)
+            used_tokens += tokens
+        summaries.append(" ".join(sentences[i] for i in sorted(selected)))
+    return summaries
+
+SUMMARIZERS = {
+    'hf_api': _summarize_batch,
+    'local': _summarize_batch_local,
+    'extractive': _summarize_batch_extractive,
+}
+if SUMMARY_BACKEND not in SUMMARIZERS:
+    raise ValueError(f"Unknown SUMMARY_BACKEND '{SUMMARY_BACKEND}'. Expected one of {', '.join(SUMMARIZERS)}.")
+
+def _summarize_chunks(text_chunks, parameters):
+    """Summarizes text_chunks with the configured backend and returns the chunk summaries in document order."""
+    batches = [text_chunks[i:i + SUMMARY_BATCH_SIZE] for i in range(0, len(text_chunks), SUMMARY_BATCH_SIZE)]
+    summarize_batch = SUMMARIZERS[SUMMARY_BACKEND]
+
+    summaries = []
+    if SUMMARY_BACKEND == 'hf_api':
+        with ThreadPoolExecutor(max_workers=max(SUMMARY_CONCURRENCY, 1)) as executor:
+            # map() yields results in submission order, whatever order the requests finish in.
+            for batch_summaries in executor.map(lambda args: summarize_batch(*args, parameters), enumerate(batches)):
+                summaries.extend(summary for summary in batch_summaries if summary)
+    else:
+        # Local backends are CPU-bound and already use all cores within a batch.
+        for batch_index, batch in enumerate(batches):
+            summaries.extend(summary for summary in summarize_batch(batch_index, batch, parameters) if summary)
+    return summaries
+
+def generate_summary(text, max_length=150, min_length=30, target_tokens=None):
+    """
+    Generates a summary of the given text with the SUMMARY_BACKEND summarizer
+    (by default the Hugging Face Inference API).
+
+    Map-reduce: the text is split on sentence boundaries into chunks of SUMMARY_CHUNK_TOKENS,
+    the chunks are summarized (SUMMARY_BATCH_SIZE per request or forward pass, with up
+    to SUMMARY_CONCURRENCY API requests in flight) and, while the joined chunk summaries
+    exceed target_tokens, they are split and summarized again. If SUMMARY_MAX_ROUNDS rounds
+    are not enough, the summary is cut to target_tokens at a sentence boundary, so the result
+    never exceeds target_tokens whatever the document length.
+    """
+    if SUMMARY_BACKEND == 'hf_api' and not HF_API_TOKEN:
+        return "Summarization service not available: Hugging Face API Token missing."
+
+    target_tokens = target_tokens or SUMMARY_TARGET_TOKENS
+    parameters = {
+        "max_length": max_length,
+        "min_length": min_length
+    }
+
+    full_summary = text
+    for round_number in range(1, SUMMARY_MAX_ROUNDS + 1):
+        text_chunks = split_text_by_tokens(full_summary, SUMMARY_CHUNK_TOKENS)
+        input_tokens = estimate_tokens(full_summary)
+        print(f"Summary round {round_number}: {len(text_chunks)} chunks, ~{input_tokens} tokens.")
+        summaries = _summarize_chunks(text_chunks, parameters)
+        # Failed chunks are left out rather than passing error markers on to the next round.
+        failed = sum(1 for summary in summaries if _is_failed_summary(summary))
+        if failed:
+            print(f"Summary round {round_number}: {failed} of {len(text_chunks)} chunks could not be summarized.")
+        summaries = [summary for summary in summaries if not _is_failed_summary(summary)]
+
+        full_summary = " ".join(summaries).strip()
+        if not full_summary:
+            return "Could not generate a complete summary due to API errors or no content."
+        output_tokens = estimate_tokens(full_summary)
+        # Stop once the summary fits, or when another round would not make it any shorter.
+        if output_tokens <= target_tokens or len(text_chunks) == 1 or output_tokens >= input_tokens:
+            break
+    if estimate_tokens(full_summary) > target_tokens:
+        print(f"Summary still has ~{estimate_tokens(full_summary)} tokens; cutting it to {target_tokens}.")
+        full_summary = truncate_to_tokens(full_summary, target_tokens)
+    return full_summary
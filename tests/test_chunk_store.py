@@ -0,0 +1,43 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from chunk_store import ChunkStore
+
+
+def _records(doc_id, count):
+    return [{'chunk_text': f'{doc_id}-{i}', 'doc_id': doc_id, 'source_filename': f'{doc_id}.pdf'}
+            for i in range(count)]
+
+
+class ChunkStoreReadOnlyTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def _sizes(self):
+        return {name: os.path.getsize(os.path.join(self.directory, name)) for name in os.listdir(self.directory)}
+
+    def test_read_only_store_ignores_torn_tail_without_truncating(self):
+        store = ChunkStore(self.directory)
+        store.append(_records('a', 3))
+        store.close()
+        # A writer that has appended text but not yet its rows.
+        with open(os.path.join(self.directory, 'chunks.txt'), 'ab') as f:
+            f.write(b'pending')
+        with open(os.path.join(self.directory, 'chunks.rows'), 'ab') as f:
+            f.write(b'\x00' * 5)
+        before = self._sizes()
+
+        reader = ChunkStore(self.directory, read_only=True)
+        self.assertEqual(len(reader), 3)
+        self.assertEqual(reader[2]['chunk_text'], 'a-2')
+        with self.assertRaises(PermissionError):
+            reader.append(_records('b', 1))
+        reader.close()
+        self.assertEqual(self._sizes(), before)
+
+
+if __name__ == '__main__':
+    unittest.main()
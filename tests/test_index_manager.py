@@ -0,0 +1,76 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from index_manager import GlobalIndexManager, IndexLoadError
+
+DIMENSION = 8
+
+
+def _records(doc_id, count):
+    return [{'chunk_text': f'{doc_id}-{i}', 'doc_id': doc_id, 'source_filename': f'{doc_id}.pdf'}
+            for i in range(count)]
+
+
+class IndexRecoveryTest(unittest.TestCase):
+    def setUp(self):
+        self.index_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.index_dir, ignore_errors=True)
+        self.rng = np.random.default_rng(0)
+
+    def _manager(self):
+        return GlobalIndexManager(self.index_dir, lambda: DIMENSION)
+
+    def _store_files(self):
+        return {name: os.path.getsize(os.path.join(self.index_dir, name)) for name in os.listdir(self.index_dir)}
+
+    def test_replays_log_after_restart(self):
+        manager = self._manager()
+        manager.add(self.rng.random((3, DIMENSION)), _records('a', 3))
+        manager.compact()
+        vectors = self.rng.random((2, DIMENSION)).astype('float32')
+        manager.add(vectors, _records('b', 2))
+
+        restarted = self._manager()
+        self.assertEqual(restarted.ntotal, 5)
+        hits = restarted.search(vectors[:1], 2, doc_id='b')[0]
+        self.assertEqual(sorted(record['chunk_text'] for _, _, record in hits), ['b-0', 'b-1'])
+
+    def test_missing_snapshot_refuses_to_start_and_keeps_files(self):
+        manager = self._manager()
+        manager.add(self.rng.random((3, DIMENSION)), _records('a', 3))
+        manager.compact()
+        manager.add(self.rng.random((2, DIMENSION)), _records('b', 2))
+        snapshots = [name for name in os.listdir(self.index_dir) if name.startswith('snapshot_')]
+        self.assertTrue(snapshots)
+        for name in snapshots:
+            os.rename(os.path.join(self.index_dir, name), os.path.join(self.index_dir, name + '.moved'))
+        before = self._store_files()
+
+        with self.assertRaises(IndexLoadError):
+            self._manager().ensure_loaded()
+        self.assertEqual(self._store_files(), before)
+
+        # With the snapshot back in place nothing has been lost.
+        for name in snapshots:
+            os.rename(os.path.join(self.index_dir, name + '.moved'), os.path.join(self.index_dir, name))
+        self.assertEqual(self._manager().ntotal, 5)
+
+    def test_torn_log_tail_is_dropped(self):
+        manager = self._manager()
+        manager.add(self.rng.random((3, DIMENSION)), _records('a', 3))
+        log_path = os.path.join(self.index_dir, 'wal_000000.log')
+        with open(log_path, 'ab') as f:
+            f.write(b'AKWL\x10\x00')
+
+        restarted = self._manager()
+        self.assertEqual(restarted.ntotal, 3)
+        restarted.add(self.rng.random((1, DIMENSION)), _records('b', 1))
+        self.assertEqual(self._manager().ntotal, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()